@@ -0,0 +1,3 @@
+"""
+Benchmarks for simago, to be run with ``asv``.
+"""
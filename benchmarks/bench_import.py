@@ -0,0 +1,64 @@
+"""
+Benchmarks for the startup time of Simago, each in a new interpreter.
+"""
+import os
+import shutil
+import tempfile
+
+
+EXAMPLE_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "example"
+)
+
+
+def _run_module_code(args):
+    """Code that runs ``python -m simago`` with arguments, without output."""
+    return "\n".join([
+        "import contextlib",
+        "import io",
+        "import runpy",
+        "import sys",
+        "sys.argv = ['simago'] + %r" % (args,),
+        "with contextlib.redirect_stdout(io.StringIO()):",
+        "    try:",
+        "        runpy.run_module('simago', run_name='__main__')",
+        "    except SystemExit:",
+        "        pass",
+    ])
+
+
+def timeraw_import_population():
+    """Importing the population module."""
+    return "import simago.population"
+
+
+class CommandLine:
+    """
+    Running ``python -m simago`` for the help text and for a small
+    population with only the categorical properties of the example.
+    """
+    def setup(self):
+        """Copy the sex and age settings of the example."""
+        self.folder = tempfile.mkdtemp()
+        shutil.copytree(os.path.join(EXAMPLE_FOLDER, "data"),
+                        os.path.join(self.folder, "data"))
+        os.mkdir(os.path.join(self.folder, "data-yaml"))
+        for filename in ["1_sex.yml", "2_age.yml"]:
+            shutil.copy(os.path.join(EXAMPLE_FOLDER, "data-yaml", filename),
+                        os.path.join(self.folder, "data-yaml"))
+
+    def teardown(self):
+        """Remove the copied settings."""
+        shutil.rmtree(self.folder)
+
+    def timeraw_help(self):
+        """``python -m simago --help``."""
+        return _run_module_code(["--help"])
+
+    def timeraw_categorical_run(self):
+        """A population of 1000 people with only categorical properties."""
+        return _run_module_code([
+            "-p", "1000",
+            "--yaml_folder", os.path.join(self.folder, "data-yaml") + "/",
+            "-o", os.path.join(self.folder, "population.csv"),
+        ])
@@ -0,0 +1,149 @@
+"""
+Benchmarks for the stages of generating a population: loading the settings
+with ``generate_population``, drawing with ``PopulationClass.update`` and
+writing with ``PopulationClass.export``, for the example settings and for
+synthetic settings with many properties and conditions, see
+``simago.synthetic``.
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+
+from simago.population import generate_population
+from simago.synthetic import write_synthetic_settings
+
+
+REPO_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+POPSIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+CONFIGS = ["example", "synthetic"]
+
+# Folders with the settings per configuration, see settings_folder.
+_settings_folders = {}
+
+
+def settings_folder(config):
+    """
+    Changes the working directory so the pdf file of the configuration can
+    be imported, and returns the folder with its settings files.
+    """
+    if config == "example":
+        os.chdir(REPO_FOLDER)
+        folder = "./example/data-yaml/"
+    else:
+        if config not in _settings_folders:
+            parent = tempfile.mkdtemp()
+            write_synthetic_settings(os.path.join(parent, "settings"),
+                                     num_properties=50, num_options=5,
+                                     fan_out=2, depth=4)
+            _settings_folders[config] = parent
+        os.chdir(_settings_folders[config])
+        folder = "./settings/"
+    if os.getcwd() not in sys.path:
+        sys.path.insert(0, os.getcwd())
+    return folder
+
+
+def quiet_generate_population(config, popsize):
+    """generate_population without printing the settings."""
+    yaml_folder = settings_folder(config)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return generate_population(popsize, yaml_folder, 100)
+
+
+class GeneratePopulation:
+    """Loading and checking the settings and building the tables."""
+    params = CONFIGS
+    param_names = ["config"]
+
+    def time_generate_population(self, config):
+        """Time to generate a population of 1000 people."""
+        quiet_generate_population(config, 1000)
+
+    def peakmem_generate_population(self, config):
+        """Peak memory of generating a population of 1000 people."""
+        quiet_generate_population(config, 1000)
+
+
+class Update:
+    """Drawing all properties."""
+    params = (CONFIGS, POPSIZES)
+    param_names = ["config", "popsize"]
+    number = 1
+    timeout = 600
+
+    def setup(self, config, popsize):
+        """Generate the population without drawing it."""
+        self.population = quiet_generate_population(config, popsize)
+
+    def time_update(self, config, popsize):
+        """Time to draw all properties."""
+        self.population.update()
+
+    def peakmem_update(self, config, popsize):
+        """Peak memory of drawing all properties."""
+        self.population.update()
+
+
+class Export:
+    """Writing a drawn population in each of the file formats."""
+    params = (CONFIGS, POPSIZES, ["csv", "parquet", "npy"])
+    param_names = ["config", "popsize", "file_format"]
+    number = 1
+    timeout = 600
+
+    def setup(self, config, popsize, file_format):
+        """Draw the population, skipping Parquet without pyarrow."""
+        if file_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise NotImplementedError
+        self.population = quiet_generate_population(config, popsize)
+        self.population.update()
+        self.output_folder = tempfile.mkdtemp()
+        self.output = os.path.join(self.output_folder, "population")
+
+    def teardown(self, config, popsize, file_format):
+        """Remove the written files."""
+        shutil.rmtree(self.output_folder)
+
+    def time_export(self, config, popsize, file_format):
+        """Time to write the population."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.population.export(self.output, file_format=file_format)
+
+    def peakmem_export(self, config, popsize, file_format):
+        """Peak memory of writing the population."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.population.export(self.output, file_format=file_format)
+
+
+class GenerateSynthetic:
+    """Loading and checking synthetic settings with many properties."""
+    params = [50, 200, 500]
+    param_names = ["num_properties"]
+    number = 1
+    timeout = 600
+
+    def setup(self, num_properties):
+        """Write the synthetic settings to a temporary folder."""
+        self.parent = tempfile.mkdtemp()
+        os.chdir(self.parent)
+        if self.parent not in sys.path:
+            sys.path.insert(0, self.parent)
+        write_synthetic_settings("./settings/", num_properties=num_properties,
+                                 num_options=5, fan_out=2, depth=5)
+
+    def teardown(self, num_properties):
+        """Remove the synthetic settings."""
+        sys.path.remove(self.parent)
+        shutil.rmtree(self.parent)
+
+    def time_generate_population(self, num_properties):
+        """Time to generate a population of 1000 people."""
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_population(1000, "./settings/", 100)
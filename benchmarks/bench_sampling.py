@@ -0,0 +1,58 @@
+"""
+Benchmarks for drawing from discrete probability distributions.
+"""
+import numpy as np
+
+from scipy import stats
+
+from simago.probability import build_alias_table, draw_from_alias_table
+
+
+class DiscreteDistribution:
+    """
+    Random discrete distributions for a small table, the 100 option age
+    table and a large categorical table. Has no benchmarks of its own.
+    """
+    params = ([2, 100, 100000], [10 ** 4, 10 ** 6])
+    param_names = ["num_options", "size"]
+
+    def setup(self, num_options, size):
+        """Generate a random discrete distribution and its alias table."""
+        self.rng = np.random.default_rng(0)
+        self.options = np.arange(num_options)
+        self.probabs = self.rng.random(num_options)
+        self.probabs /= self.probabs.sum()
+        self.alias_table = build_alias_table(self.options, self.probabs)
+
+
+class AliasSampling(DiscreteDistribution):
+    """Sampling with the alias method."""
+
+    def time_build_alias_table(self, num_options, size):
+        """Building the alias table, done once per property."""
+        build_alias_table(self.options, self.probabs)
+
+    def time_draw_from_alias_table(self, num_options, size):
+        """Drawing from a prebuilt alias table."""
+        draw_from_alias_table(self.alias_table, size, self.rng)
+
+
+class RvDiscreteSampling(DiscreteDistribution):
+    """
+    The ``scipy.stats.rv_discrete`` based sampler replaced by the alias
+    method, as a reference for ``AliasSampling``.
+    """
+
+    def setup(self, num_options, size):
+        """Skip the cases for which rv_discrete runs out of memory."""
+        # rv_discrete.rvs compares every draw with the full CDF.
+        if num_options * size > 10 ** 9:
+            raise NotImplementedError
+        super().setup(num_options, size)
+
+    def time_rv_discrete(self, num_options, size):
+        """Build rv_discrete and draw from it, as done for every draw."""
+        sample_rv = stats.rv_discrete(
+            name="sample_rv", values=(self.options, self.probabs)
+        )
+        sample_rv.rvs(size=size)
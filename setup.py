@@ -49,6 +49,7 @@ CLASSIFIERS = [
     "Topic :: Scientific/Engineering"
 ]
 INSTALL_REQUIRES = ["wheel", "numpy", "scipy", "pandas", "pyYAML"]
+EXTRAS_REQUIRE = {"parquet": ["pyarrow"]}
 
 ###################################################################
 
@@ -75,4 +76,5 @@ if __name__ == "__main__":
         zip_safe=False,
         classifiers=CLASSIFIERS,
         install_requires=INSTALL_REQUIRES,
+        extras_require=EXTRAS_REQUIRE,
     )
@@ -7,8 +7,6 @@ Generate the example population with the expression:
 
 import argparse
 
-from simago.population import generate_population
-
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -24,9 +22,60 @@ if __name__ == '__main__':
     parser.add_argument("--yaml_folder", type=str,
                         default="./data-yaml/",
                         help="Location of YAML files for the aggregated data.")
+    parser.add_argument("--chunk_size", type=int, default=None,
+                        help="Generate and write the population in chunks "
+                        + "of this many people.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes.")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="File in which the properties compiled from "
+                        + "the YAML files are cached.")
+    parser.add_argument("--metrics", type=str, default=None,
+                        help="JSON file to which the time and memory use "
+                        + "of the stages of the run are written.")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="Number of threads per process to draw "
+                        + "independent properties at the same time.")
+    parser.add_argument("--format", type=str, default="csv",
+                        choices=["csv", "parquet", "npy"],
+                        help="File format of the output.")
+    parser.add_argument("--counts", action="store_true",
+                        help="Write the number of people per combination "
+                        + "of options of the properties instead of the "
+                        + "people, to a CSV file.")
+    parser.add_argument("--counter_based", action="store_true",
+                        help="Draw with counter-based random numbers per "
+                        + "person_id, so single people can be recomputed.")
     args = parser.parse_args()
 
-    population = generate_population(args.popsize, args.yaml_folder,
-                                     args.rand_seed)
-    population.update()
-    population.export(args.output, nowrite=args.nowrite)
+    # Imported after parsing the arguments, so --help does not wait for it.
+    from simago.metrics import Metrics
+    from simago.population import generate_population
+
+    metrics = None if args.metrics is None else Metrics()
+
+    if args.counts:
+        from simago.aggregate import generate_aggregate
+
+        aggregate = generate_aggregate(args.popsize, args.yaml_folder,
+                                       args.rand_seed, cache_file=args.cache,
+                                       metrics=metrics)
+        aggregate.update()
+        aggregate.export(args.output, nowrite=args.nowrite)
+    else:
+        population = generate_population(args.popsize, args.yaml_folder,
+                                         args.rand_seed,
+                                         workers=args.workers,
+                                         threads=args.threads,
+                                         cache_file=args.cache,
+                                         metrics=metrics,
+                                         counter_based=args.counter_based)
+        if args.chunk_size is None:
+            population.update()
+            population.export(args.output, nowrite=args.nowrite,
+                              file_format=args.format)
+        else:
+            population.stream(args.output, args.chunk_size,
+                              nowrite=args.nowrite, file_format=args.format)
+    if metrics is not None:
+        metrics.to_json(args.metrics)
@@ -0,0 +1,345 @@
+"""
+Class for drawing the number of people per combination of options of the
+properties, without drawing the people themselves.
+"""
+import os
+import time
+
+import numpy as np
+
+from .population import PopulationClass, load_probab_objects
+from .probability import (
+    ProbabilityClass,
+    allocate_quota,
+    get_cdf_table_probabs,
+    get_dependency_levels,
+    split_condition_cells,
+)
+
+
+class AggregateClass:
+    """
+    AggregateClass stores a population as the number of people per group,
+    where a group is a combination of options of the discrete properties.
+
+    The properties are drawn per level of their dependency graph. The people
+    of every group are divided over the options of a discrete property with
+    a multinomial draw from the distribution of the condition cell of the
+    group, which splits the group. The time and memory use therefore scale
+    with the number of groups instead of the size of the population.
+    Continuous properties keep the condition cell of every group; their
+    values are only drawn when the people are materialized with
+    ``to_population``.
+
+    The counts follow the same distribution as the people drawn by a
+    PopulationClass with the same settings, but are not drawn from the same
+    random streams.
+
+    Parameters
+    ----------
+    popsize : int
+        Size of the population.
+    random_seed : int
+        Seed for random number generation. Defaults to None.
+    metrics : simago.metrics.Metrics
+        Object in which the time and memory use of drawing is recorded, see
+        ``simago.metrics``. Defaults to None.
+
+    Attributes
+    ----------
+    counts : NumPy array
+        Number of people per group.
+    columns : dict
+        Option per group of every drawn discrete property.
+    cells : dict
+        Condition index per group of every drawn continuous property, -1
+        for groups for which none of the conditions hold.
+    labels : dict
+        Array of the labels per option code of every discrete property.
+    prob_objects : dict
+        ProbabilityClass objects of the properties.
+
+    """
+
+    def __init__(self, popsize, random_seed=None, metrics=None):
+        assert popsize >= 1, "Population size must be 1 or greater."
+        self.popsize = popsize
+        self.random_seed = random_seed
+        self.seed_sequence = np.random.SeedSequence(random_seed)
+        self.metrics = metrics
+        self.prob_objects = {}
+        self._reset()
+
+    def _reset(self):
+        """Puts the whole population in a single group."""
+        self.counts = np.array([self.popsize], dtype=np.int64)
+        self.columns = {}
+        self.cells = {}
+        self.labels = {}
+
+    def add_property(self, ProbClass):
+        """
+        Adds a ProbabilityClass object to the AggregateClass object.
+
+        Parameters
+        ----------
+        ProbClass : ProbabilityClass object
+            ProbabilityClass object for the property.
+        """
+        if not isinstance(ProbClass, ProbabilityClass):
+            print("Added property is not an instance of ProbabilityClass")
+        elif ProbClass.property_name in self.prob_objects.keys():
+            print("Property is already defined in the AggregateClass"
+                  + " instance.")
+        else:
+            self.prob_objects[ProbClass.property_name] = ProbClass
+
+    def get_rng(self, property_name):
+        """
+        Gets the random number generator of a property, spawned from
+        ``seed_sequence``.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be drawn.
+
+        Returns
+        -------
+        rng : numpy.random.Generator
+        """
+        seed_sequence = np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=(int.from_bytes(property_name.encode(), "little"),),
+        )
+        return np.random.default_rng(seed_sequence)
+
+    def update(self):
+        """
+        Draws the counts of all properties, starting from a single group
+        with the whole population.
+        """
+        levels = get_dependency_levels(list(self.prob_objects.values()))
+        continuous = [prob_obj for level in levels for prob_obj in level
+                      if prob_obj.data_type == "continuous"]
+        for prob_obj in continuous:
+            for other in self.prob_objects.values():
+                assert prob_obj.property_name not in other.dependencies, (
+                    other.property_name
+                    + ", aggregates can not be conditioned on the "
+                    + "continuous property "
+                    + prob_obj.property_name
+                )
+
+        self._reset()
+        for level in levels:
+            for prob_obj in level:
+                if prob_obj.data_type != "continuous":
+                    self._draw_property(prob_obj)
+        # Continuous properties do not split the groups, so their condition
+        # cells are found once all groups are known.
+        for prob_obj in continuous:
+            self.cells[prob_obj.property_name] = \
+                self._get_group_cells(prob_obj)
+
+    def _get_group_cells(self, prob_obj):
+        """Assigns every group to a condition cell of a property."""
+        if prob_obj.conditions is None:
+            return np.zeros(self.counts.shape[0], dtype=np.int64)
+        # The groups are evaluated as a population with one person per
+        # group.
+        groups = PopulationClass(self.counts.shape[0])
+        groups.add_property(prob_obj)
+        for prop, values in self.columns.items():
+            groups.add_property(self.prob_objects[prop])
+            groups.store_property(prop, values)
+        return groups.get_condition_cells(prob_obj.property_name)
+
+    def _draw_property(self, prob_obj):
+        """Divides the groups over the options of a discrete property."""
+        start_time = time.perf_counter()
+        cells = self._get_group_cells(prob_obj)
+        rng = self.get_rng(prob_obj.property_name)
+        cdf_table = prob_obj.cdf_table
+        num_cells = cdf_table.offsets.shape[0] - 1
+
+        # Number of people per group and option, with the people without a
+        # condition cell at the code for missing data.
+        table = np.zeros((self.counts.shape[0], prob_obj.nodata + 1),
+                         dtype=np.int64)
+        has_cell = cells >= 0
+        table[~has_cell, prob_obj.nodata] = self.counts[~has_cell]
+        if prob_obj.sampling == "quota":
+            # The quotas of a cell are divided over its groups with
+            # hypergeometric draws, one option at a time.
+            quotas = allocate_quota(cdf_table, np.bincount(
+                cells[has_cell], weights=self.counts[has_cell],
+                minlength=num_cells,
+            ).astype(np.int64))
+            for cond_index, groups in split_condition_cells(cells):
+                remaining = self.counts[groups].copy()
+                for entry in range(cdf_table.offsets[cond_index],
+                                   cdf_table.offsets[cond_index + 1]):
+                    if quotas[entry] == 0:
+                        continue
+                    drawn = rng.multivariate_hypergeometric(
+                        remaining, quotas[entry]
+                    )
+                    table[groups, cdf_table.options[entry]] += drawn
+                    remaining -= drawn
+        else:
+            probabs = np.zeros((num_cells, prob_obj.nodata + 1))
+            probabs[
+                np.repeat(np.arange(num_cells), np.diff(cdf_table.offsets)),
+                cdf_table.options,
+            ] = get_cdf_table_probabs(cdf_table)
+            table[has_cell] = rng.multinomial(self.counts[has_cell],
+                                              probabs[cells[has_cell]])
+
+        groups, options = np.nonzero(table)
+        self.counts = table[groups, options]
+        self.columns = {prop: values[groups]
+                        for prop, values in self.columns.items()}
+        self.columns[prob_obj.property_name] = options.astype(prob_obj.dtype)
+        self.labels[prob_obj.property_name] = prob_obj.label_array
+        if self.metrics is not None:
+            self.metrics.record(
+                "draw", time.perf_counter() - start_time,
+                property_name=prob_obj.property_name, people=self.popsize,
+                nbytes=table.nbytes,
+            )
+
+    def get_counts(self, property_names=None):
+        """
+        Gets the number of people per combination of options of properties.
+
+        Parameters
+        ----------
+        property_names : list of strings
+            Names of the properties to count the combinations of. Defaults
+            to None, which uses all drawn properties. Discrete properties
+            are given by their labels and continuous properties by their
+            condition index, in a column named ``<property>_cond_index``.
+
+        Returns
+        -------
+        counts : DataFrame
+            The combinations of options with at least one person and their
+            number of people in the column ``count``.
+        """
+        import pandas as pd
+
+        if property_names is None:
+            property_names = list(self.columns) + list(self.cells)
+        data = {}
+        for prop in property_names:
+            if prop in self.columns:
+                data[prop] = self.labels[prop].take(self.columns[prop])
+            else:
+                data[prop + "_cond_index"] = self.cells[prop]
+        data["count"] = self.counts
+        counts = pd.DataFrame(data)
+        if len(data) == 1:
+            return counts.sum().to_frame().T
+        return counts.groupby(list(data)[:-1], sort=True).sum() \
+            .reset_index()
+
+    def to_population(self, block_size=2 ** 16):
+        """
+        Materializes the people of the groups in a PopulationClass, in a
+        random order. The values of the continuous properties are drawn by
+        the PopulationClass.
+
+        Parameters
+        ----------
+        block_size : int
+            Block size of the population, see PopulationClass.
+
+        Returns
+        -------
+        population : PopulationClass
+        """
+        population = PopulationClass(self.popsize, self.random_seed,
+                                     block_size, metrics=self.metrics)
+        for prob_obj in self.prob_objects.values():
+            population.add_property(prob_obj)
+        order = self.get_rng("person_id").permutation(self.popsize)
+        for prop, values in self.columns.items():
+            population.store_property(prop,
+                                      np.repeat(values, self.counts)[order])
+        if self.cells:
+            # Nothing depends on the continuous properties, so only they
+            # are drawn.
+            population.update(list(self.cells))
+        return population
+
+    def export(self, output, nowrite=False):
+        """
+        Exports the counts of all combinations of options, see
+        ``get_counts``, to a CSV file.
+
+        Parameters
+        ----------
+        output : string
+            Path and filename for the file.
+        nowrite : boolean
+            If True, the counts will only be printed to the command line and
+            not written to file. Defaults to False.
+        """
+        assert isinstance(output, str), "Filename should be of type string"
+        counts = self.get_counts()
+        print("------------------------")
+        if nowrite:
+            print("Generated counts:")
+            print(counts)
+            print("------------------------")
+            print("Counts are not written to disk.")
+        else:
+            start_time = time.perf_counter()
+            counts.to_csv(output, index=False)
+            if self.metrics is not None:
+                self.metrics.record("export", time.perf_counter() - start_time,
+                                    people=self.popsize,
+                                    nbytes=os.path.getsize(output))
+            print("Counts are written to %s" % (output))
+
+
+def generate_aggregate(popsize, yaml_folder, rand_seed=None, cache_file=None,
+                       metrics=None):
+    """
+    Generate the counts of a population.
+
+    Parameters
+    ----------
+    popsize : int
+        Size of population.
+    yaml_folder : string
+        Folder with settings YAML files.
+    rand_seed : int
+        Seed for random number generation.
+    cache_file : string
+        File in which the ProbabilityClass objects are cached, see
+        ``load_probab_objects``. Defaults to None, which does not cache.
+    metrics : simago.metrics.Metrics
+        Object in which the time and memory use is recorded. Defaults to
+        None.
+
+    Returns
+    -------
+    AggregateClass object
+
+    """
+    print("Population size: %d" % (popsize))
+    if rand_seed is None:
+        print("No random seed defined")
+    else:
+        print("Random seed: %d" % (rand_seed))
+
+    print("------------------------")
+    probab_objects = load_probab_objects(yaml_folder, cache_file, metrics)
+
+    aggregate = AggregateClass(popsize, rand_seed, metrics=metrics)
+    for obj in probab_objects:
+        aggregate.add_property(obj)
+
+    return aggregate
@@ -0,0 +1,98 @@
+"""
+Functions for caching the compiled ProbabilityClass objects of a set of
+settings files on disk.
+"""
+import hashlib
+import os
+import pickle
+
+import yaml
+
+from . import __version__
+from .yamlutils import adjust_filenames
+
+
+def hash_settings(yaml_filenames):
+    """Hash settings files.
+
+    Computes a hash of the contents of the settings files and of the data,
+    conditions and pdf files they refer to, and of the version of Simago.
+    The hash changes when any of these files change.
+
+    Parameters
+    ----------
+    yaml_filenames : list of str
+        List of YAML filenames.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal SHA-256 hash.
+    """
+    sha = hashlib.sha256(__version__.encode())
+    for yaml_filename in yaml_filenames:
+        with open(yaml_filename, 'rb') as yaml_file:
+            content = yaml_file.read()
+        filenames = [yaml_filename]
+        try:
+            yaml_object = yaml.safe_load(content)
+        except yaml.YAMLError:
+            # Invalid files are reported when the settings are loaded.
+            yaml_object = None
+        if isinstance(yaml_object, dict):
+            yaml_object['yaml_filename'] = yaml_filename
+            yaml_object = adjust_filenames(yaml_object)
+            filenames += [
+                yaml_object[key]
+                for key in ['data_file', 'conditions', 'pdf_file']
+                if isinstance(yaml_object.get(key), str)
+            ]
+        for filename in filenames:
+            sha.update(filename.encode() + b'\0')
+            if os.path.isfile(filename):
+                with open(filename, 'rb') as data_file:
+                    sha.update(data_file.read())
+            sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def read_cache(cache_file, key):
+    """Read cached ProbabilityClass objects.
+
+    Parameters
+    ----------
+    cache_file : str
+        Filename of the cache.
+    key : str
+        Hash of the settings files, see ``hash_settings``.
+
+    Returns
+    -------
+    probab_objects : list of ProbabilityClass objects or None
+        The cached objects, or None if there is no cache or if the cache was
+        written for different settings files.
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    with open(cache_file, 'rb') as cache:
+        # The key is stored first, so a stale cache is not read further.
+        if pickle.load(cache) != key:
+            return None
+        return pickle.load(cache)
+
+
+def write_cache(cache_file, key, probab_objects):
+    """Write ProbabilityClass objects to the cache.
+
+    Parameters
+    ----------
+    cache_file : str
+        Filename of the cache.
+    key : str
+        Hash of the settings files, see ``hash_settings``.
+    probab_objects : list of ProbabilityClass objects
+        Checked and ordered objects.
+    """
+    with open(cache_file, 'wb') as cache:
+        pickle.dump(key, cache, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(probab_objects, cache, protocol=pickle.HIGHEST_PROTOCOL)
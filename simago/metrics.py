@@ -0,0 +1,120 @@
+"""
+Class for recording the time and memory use of the stages of a run.
+"""
+import json
+import threading
+
+
+class Metrics:
+    """
+    Records the wall time, number of people and bytes allocated of the
+    stages of generating a population, per property and condition cell.
+
+    Records with the same stage, property and condition index are summed,
+    so the memory use of the metrics does not grow with the number of draws
+    and it can be kept on in production.
+
+    The stages are:
+
+    * ``load``: finding and checking the settings files, or reading the
+      cache, see ``load_probab_objects``.
+    * ``compile``: creating, checking and ordering the ProbabilityClass
+      objects.
+    * ``condition_cell``: selecting the people of a condition cell of a
+      property, per condition index. When the condition indices are looked
+      up in a single pass, see ``PopulationClass.get_condition_cells``, its
+      time and memory are divided over them by their number of people.
+    * ``draw``: drawing the values of a property.
+    * ``export``: writing the population, with the bytes written.
+
+    Parameters
+    ----------
+    callback : function
+        Function that is called with the stage, property name, condition
+        index, seconds, people and bytes of every record. Defaults to None.
+
+    Attributes
+    ----------
+    records : dict
+        Totals per ``(stage, property_name, cond_index)``, as a dict with
+        the number of calls, seconds, people and bytes.
+
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, property_name=None, cond_index=None,
+               people=0, nbytes=0):
+        """
+        Adds a measurement to the totals.
+
+        Parameters
+        ----------
+        stage : string
+            Stage of the run, see the class docstring.
+        seconds : float
+            Wall time of the stage.
+        property_name : string
+            Property the stage was done for. Defaults to None.
+        cond_index : int
+            Condition index the stage was done for. Defaults to None.
+        people : int
+            Number of people the stage was done for. Defaults to 0.
+        nbytes : int
+            Bytes allocated, or written for ``export``. Defaults to 0.
+        """
+        key = (stage, property_name, cond_index)
+        with self._lock:
+            if key not in self.records:
+                self.records[key] = {
+                    "calls": 0, "seconds": 0.0, "people": 0, "bytes": 0
+                }
+            totals = self.records[key]
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["people"] += int(people)
+            totals["bytes"] += int(nbytes)
+        if self.callback is not None:
+            self.callback(stage, property_name, cond_index, seconds, people,
+                          nbytes)
+
+    def to_list(self):
+        """
+        Gets the totals as a list of dicts, one per stage, property and
+        condition index, in the order in which they were first recorded.
+
+        Returns
+        -------
+        records : list of dict
+        """
+        with self._lock:
+            return [
+                dict(stage=stage, property_name=property_name,
+                     cond_index=None if cond_index is None
+                     else int(cond_index),
+                     **totals)
+                for (stage, property_name, cond_index), totals
+                in self.records.items()
+            ]
+
+    def to_json(self, output=None):
+        """
+        Exports the totals as JSON.
+
+        Parameters
+        ----------
+        output : string
+            Path and filename of the JSON file. Defaults to None, which only
+            returns the JSON.
+
+        Returns
+        -------
+        metrics_json : string
+        """
+        metrics_json = json.dumps({"records": self.to_list()}, indent=2)
+        if output is not None:
+            with open(output, "w") as json_file:
+                json_file.write(metrics_json)
+        return metrics_json
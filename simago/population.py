@@ -1,19 +1,35 @@
 """
 Functions around the PopulationClass object.
 """
+import json
+import os
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import reduce
+
 import numpy as np
-import pandas as pd
 
+from .cache import hash_settings, read_cache, write_cache
 from .probability import (
+    RELATIONS,
     ContinuousProbabilityClass,
     DiscreteProbabilityClass,
     ProbabilityClass,
     check_comb_conditions,
+    get_dependency_levels,
     order_probab_objects,
 )
+from .writers import MANIFEST, WRITERS
 from .yamlutils import find_yamls, load_yamls
 
 
+# Largest number of entries of a lookup table of condition cells, see
+# PopulationClass.get_condition_cells.
+CELL_LOOKUP_SIZE = 2 ** 21
+
+
 class PopulationClass:
     """
     Class for the population.
@@ -25,23 +41,92 @@ class PopulationClass:
         Size of population.
     random_seed : int
         Seed for random number generation. Defaults to None.
+    block_size : int
+        Number of people per block of person_ids with its own random stream.
+        Defaults to 65536.
+    first_person_id : int
+        The person_id of the first person in the population, for populations
+        that are a chunk of a larger population. Should be a multiple of
+        ``block_size``. Defaults to 0.
+    workers : int
+        Number of worker processes used to draw all properties in chunks.
+        Defaults to 1, which draws in the current process.
+    threads : int
+        Number of threads used to draw properties that do not depend on
+        each other at the same time. Defaults to 1.
+    metrics : simago.metrics.Metrics
+        Object in which the time and memory use of drawing and exporting
+        is recorded. Defaults to None, which records nothing.
+    counter_based : bool
+        If True, every person uses the same random numbers for a property,
+        whoever else is drawn, see ``get_counter_rng``. The attributes of
+        any person can then be computed on their own with ``get_person``.
+        Defaults to False.
 
     Attributes
     ----------
     random_seed : int
         Seed for random number generation.
+    seed_sequence : numpy.random.SeedSequence
+        Root of the random streams of the properties. If ``random_seed`` is
+        None, ``seed_sequence.entropy`` can be used to reproduce the
+        population.
+    block_size : int
+        Number of people per block of person_ids with its own random stream.
+    first_person_id : int
+        The person_id of the first person in the population.
+    workers : int
+        Number of worker processes.
+    threads : int
+        Number of threads per process.
+    metrics : simago.metrics.Metrics or None
+        Recorded time and memory use.
+    counter_based : bool
+        Whether the random numbers are counter-based per person_id.
     popsize : int
         Size of the population.
     prob_objects : list
         List of ProbabilityClass objects.
+    columns : dict
+        Drawn values per property, as one NumPy array per property with a
+        value for every person. The position in the array is the person_id.
+        Discrete properties are stored as option codes, with the code
+        ``ProbabilityClass.nodata`` for people without data.
+    labels : dict
+        Labels per option code of the discrete properties in ``columns``, as
+        in ``DiscreteProbabilityClass.label_array``.
     population : Pandas DataFrame
-        DataFrame containing the generated population.
+        DataFrame containing the generated population. The DataFrame is
+        built on request as a view on ``columns``.
 
     """
 
-    def __init__(self, popsize, random_seed=None):
-        # Set up random seed
+    def __init__(self, popsize, random_seed=None, block_size=2 ** 16,
+                 first_person_id=0, workers=1, threads=1, metrics=None,
+                 counter_based=False):
+        # Set up random seed. Every property draws from its own streams,
+        # spawned from the seed sequence, see get_rng.
         self.random_seed = random_seed
+        self.seed_sequence = np.random.SeedSequence(random_seed)
+        assert block_size >= 1, "Block size must be 1 or greater."
+        self.block_size = block_size
+        assert first_person_id % block_size == 0, \
+            "The first person_id must be a multiple of the block size."
+        self.first_person_id = first_person_id
+        assert workers >= 1, "Number of workers must be 1 or greater."
+        self.workers = workers
+        assert threads >= 1, "Number of threads must be 1 or greater."
+        self.threads = threads
+        self.metrics = metrics
+        self.counter_based = counter_based
+        # Explicit person_ids of a population of selected people, see
+        # get_person.
+        self._person_ids = None
+        # Number of times each property has been drawn.
+        self._draw_counts = {}
+        # Properties of which only some people were redrawn in the last
+        # draw, see get_person.
+        self._partial_draws = set()
 
         # Generate empty population
         assert popsize >= 1, "Population size must be 1 or greater."
@@ -51,6 +136,13 @@ class PopulationClass:
         # Initialize dictionary of probability objects
         self.prob_objects = {}
 
+        # Cache of boolean masks for the conditions, shared between the
+        # properties. Keys are (property_name, relation, option).
+        self._mask_cache = {}
+        # Lookup tables of condition cells per property and number of codes
+        # of its dependencies, see get_condition_cells.
+        self._cell_lookups = {}
+
     def __eq__(self, other):
         """Equality between two PopulationClass instances."""
         if isinstance(other, PopulationClass):
@@ -63,11 +155,32 @@ class PopulationClass:
 
     def _generate_population(self):
         """Generate initial population."""
-        self.population = pd.DataFrame(
-            {"person_id": np.linspace(0, self.popsize - 1, self.popsize)}
+        # The person_id is implicit, so an empty population has no columns.
+        self.columns = {}
+        # Value in the columns for people without data.
+        self._nodata = {}
+        self.labels = {}
+
+    @property
+    def person_id(self):
+        """NumPy array with the person_id of every person."""
+        if self._person_ids is not None:
+            return self._person_ids
+        return np.arange(
+            self.first_person_id, self.first_person_id + self.popsize
         )
 
-        self.population["person_id"] = self.population["person_id"].apply(int)
+    @property
+    def population(self):
+        """
+        DataFrame with the person_id and the drawn properties. The property
+        columns share their memory with ``columns``.
+        """
+        import pandas as pd
+
+        data = {"person_id": self.person_id}
+        data.update(self.columns)
+        return pd.DataFrame(data, copy=False)
 
     def add_property(self, ProbClass):
         """
@@ -104,28 +217,599 @@ class PopulationClass:
         else:
             print("Property is not defined in the PopulationClass instance.")
 
-    # def update(self, property_name="all", people_id="all"):
-    def update(self, property_name="all"):
+    def update(self, property_name="all", people_id="all"):
         """
         Updates properties for the population by drawing new values.
 
+        The properties are drawn per level of their dependency graph, see
+        ``get_dependency_levels``. With more than one thread, the properties
+        in a level are drawn at the same time.
+
         Parameters
         ----------
-        property_name : string
-            Name of property to be updated. Defaults to 'all' which updates
-            all of the properties defined for in the PopulationClass instance.
+        property_name : string or list of strings
+            Name of property to be updated. The drawn properties that depend
+            on it, directly or through other properties, are updated as well,
+            see ``get_dependents``. Defaults to 'all' which updates all of
+            the properties defined for in the PopulationClass instance.
+            With more than one worker, updating all properties is done in
+            chunks by the worker processes.
+        people_id : array-like
+            The person_ids of the people to be updated, or a boolean mask
+            over the population. The conditions are only evaluated and the
+            values only drawn for these people; the values of the other
+            people are kept. Defaults to 'all' which updates everyone.
         """
-        if property_name == "all":
-            for prob_obj in self.prob_objects.values():
-                self.population = prob_obj.draw_values(self)
+        positions = self._get_positions(people_id)
+        if property_name == "all" and self.workers > 1 and positions is None:
+            self._update_parallel()
+            return
+        elif property_name == "all":
+            prob_objects = list(self.prob_objects.values())
         else:
             # Make a singular property name a list to homogenize the next code
             # section.
             if isinstance(property_name, str):
                 property_name = [property_name]
-            for prob_obj in self.prob_objects.values():
-                if prob_obj.property_name in property_name:
-                    self.population = prob_obj.draw_values(self)
+            # Drawn properties that depend on the updated properties would
+            # keep values drawn for the old values; they are redrawn too.
+            redraw = set(property_name) | (
+                self.get_dependents(property_name) & set(self.columns)
+            )
+            prob_objects = [
+                prob_obj for prob_obj in self.prob_objects.values()
+                if prob_obj.property_name in redraw
+            ]
+
+        try:
+            self._draw_levels(get_dependency_levels(prob_objects), positions)
+        finally:
+            # Masks are only shared within an update, so they do not keep
+            # memory the size of a column per condition afterwards.
+            self._mask_cache.clear()
+
+    def _draw_levels(self, levels, positions=None):
+        """
+        Draws the properties per level of their dependency graph, with the
+        properties of a level at the same time if there is more than one
+        thread.
+        """
+        if self.threads == 1 or max(map(len, levels), default=0) <= 1:
+            for level in levels:
+                for prob_obj in level:
+                    self._draw_property(prob_obj, positions)
+            return
+        with ThreadPoolExecutor(self.threads) as executor:
+            for level in levels:
+                # The threads only read the columns of earlier levels; the
+                # drawn columns are stored afterwards.
+                drawn = list(executor.map(
+                    lambda prob_obj: self._draw_values(prob_obj, positions),
+                    level,
+                ))
+                for prob_obj, values in zip(level, drawn):
+                    self._store_property(prob_obj, values, positions)
+
+    def _get_positions(self, people_id):
+        """
+        Converts person_ids or a boolean mask to sorted positions in the
+        population; None for 'all'.
+        """
+        if isinstance(people_id, str):
+            assert people_id == "all", "Argument people_id should be 'all', " \
+                + "an array of person_ids or a boolean mask"
+            return None
+        people_id = np.asarray(people_id)
+        if people_id.dtype == bool:
+            assert people_id.shape == (self.popsize,), \
+                "Mask of people should have the size of the population"
+            return np.flatnonzero(people_id)
+        # Empty selections and float arrays of whole numbers are cast to
+        # integer person_ids.
+        assert np.all(people_id == np.round(people_id)), \
+            "Argument people_id should contain whole person_ids"
+        people_id = np.asarray(people_id, dtype=np.int64)
+        positions = np.unique(people_id - self.first_person_id)
+        assert (positions.shape[0] == 0) or (
+            (positions[0] >= 0) and (positions[-1] < self.popsize)
+        ), "Unknown person_id"
+        return positions
+
+    def get_dependents(self, property_name):
+        """
+        Gets the properties that depend on properties through their
+        conditions, directly or through other properties.
+
+        Parameters
+        ----------
+        property_name : string or list of strings
+            Name(s) of the properties.
+
+        Returns
+        -------
+        dependents : set
+            Names of the dependent properties, without the properties
+            themselves unless they are part of a cycle.
+        """
+        if isinstance(property_name, str):
+            property_name = [property_name]
+        dependents = {}
+        for prob_obj in self.prob_objects.values():
+            for dep in prob_obj.dependencies:
+                dependents.setdefault(dep, []).append(prob_obj.property_name)
+
+        found = set()
+        stack = list(property_name)
+        while stack:
+            for dependent in dependents.get(stack.pop(), []):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return found
+
+    def get_person(self, people_id):
+        """
+        Computes the attributes of people without drawing the rest of the
+        population, for ``counter_based`` populations. The properties are
+        drawn through their dependencies for these people only, with the
+        same random numbers as when drawing everyone.
+
+        The values match the last draw of the properties for everyone, or
+        the next draw for properties that have not been drawn yet, e.g. of
+        a streamed population. After an update of some of the people, the
+        values of a property come from different draws, so people can not be
+        computed until it is drawn for everyone again.
+
+        Parameters
+        ----------
+        people_id : array-like
+            The person_ids of the people. These may lie beyond the size of
+            the population.
+
+        Returns
+        -------
+        people : DataFrame
+            The labelled attributes of the people, see
+            ``get_labelled_population``, ordered by person_id.
+        """
+        assert self.counter_based, \
+            "Single people can only be drawn for counter-based populations"
+        people_id = np.unique(np.asarray(people_id, dtype=np.int64))
+        assert (people_id.shape[0] > 0) and (people_id[0] >= 0), \
+            "Argument people_id should contain person_ids of 0 or greater"
+        assert not self._partial_draws, (
+            "Single people can not be drawn after a partial update of "
+            + ", ".join(sorted(self._partial_draws))
+        )
+
+        people = PopulationClass(people_id.shape[0], self.random_seed,
+                                 self.block_size, counter_based=True)
+        people.seed_sequence = self.seed_sequence
+        people._person_ids = people_id
+        people.prob_objects = dict(self.prob_objects)
+        # The draw of which the columns hold the values.
+        people._draw_counts = {
+            prop: count - 1 if prop in self.columns else count
+            for prop, count in self._draw_counts.items()
+        }
+        people.update()
+        return people.get_labelled_population()
+
+    def _update_parallel(self):
+        """Draws all properties in chunks with the worker processes."""
+        start_time = time.perf_counter()
+        columns = {
+            prob_obj.property_name: np.empty(self.popsize, prob_obj.dtype)
+            for prob_obj in self.prob_objects.values()
+        }
+        # A few chunks per worker balances the load between the workers.
+        chunk_size = -(-self.popsize // (4 * self.workers))
+        for chunk in self.iter_chunks(chunk_size):
+            start = chunk.first_person_id - self.first_person_id
+            for prop, values in chunk.columns.items():
+                columns[prop][start:start + chunk.popsize] = values
+        for prob_obj in self.prob_objects.values():
+            prop = prob_obj.property_name
+            self.columns[prop] = columns[prop]
+            self._set_column_info(prob_obj)
+            self._draw_counts[prop] = self._draw_counts.get(prop, 0) + 1
+        self._partial_draws.clear()
+        self._mask_cache.clear()
+        if self.metrics is not None:
+            # The workers do not record per property.
+            self.metrics.record(
+                "draw", time.perf_counter() - start_time,
+                people=self.popsize,
+                nbytes=sum(values.nbytes for values in columns.values()),
+            )
+
+    def _draw_property(self, prob_obj, positions=None):
+        """Draws new values for a property and invalidates its masks."""
+        self._store_property(
+            prob_obj, self._draw_values(prob_obj, positions), positions
+        )
+
+    def _draw_values(self, prob_obj, positions=None):
+        """Draws new values for a property and records the metrics."""
+        start_time = time.perf_counter()
+        values = prob_obj.draw_values(self, positions)
+        if self.metrics is not None:
+            self.metrics.record(
+                "draw", time.perf_counter() - start_time,
+                property_name=prob_obj.property_name,
+                people=values.shape[0], nbytes=values.nbytes,
+            )
+        return values
+
+    def store_property(self, property_name, values):
+        """
+        Stores given values for a property for everyone in the population,
+        instead of drawing them. The properties that depend on it are not
+        redrawn.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be stored. The property must be added to the
+            PopulationClass instance.
+        values : array-like
+            Value of every person in the population, in the codes of the
+            options for discrete properties.
+        """
+        assert property_name in self.prob_objects, \
+            "Property is not defined in the PopulationClass instance."
+        prob_obj = self.prob_objects[property_name]
+        values = np.asarray(values, dtype=prob_obj.dtype)
+        assert values.shape == (self.popsize,), \
+            "Values should have the size of the population"
+        self._store_property(prob_obj, values)
+
+    def _store_property(self, prob_obj, values, positions=None):
+        """
+        Stores drawn values for a property, for everyone or in place for the
+        people at positions, and invalidates its masks.
+        """
+        if positions is None:
+            self.columns[prob_obj.property_name] = values
+            self._partial_draws.discard(prob_obj.property_name)
+        else:
+            self._partial_draws.add(prob_obj.property_name)
+            if prob_obj.property_name not in self.columns:
+                self.columns[prob_obj.property_name] = np.full(
+                    self.popsize, prob_obj.nodata, dtype=prob_obj.dtype
+                )
+            self.columns[prob_obj.property_name][positions] = values
+        self._set_column_info(prob_obj)
+        self._draw_counts[prob_obj.property_name] = (
+            self._draw_counts.get(prob_obj.property_name, 0) + 1
+        )
+        self._invalidate_masks(prob_obj.property_name)
+
+    def _set_column_info(self, prob_obj):
+        """Stores the code for missing data and the labels of a column."""
+        self._nodata[prob_obj.property_name] = prob_obj.nodata
+        if prob_obj.data_type in ["categorical", "ordinal"]:
+            self.labels[prob_obj.property_name] = prob_obj.label_array
+
+    def get_rng(self, property_name, block=0):
+        """
+        Gets the random number generator for a block of person_ids of a
+        property.
+
+        Every property, draw and block has an independent stream spawned
+        from ``seed_sequence``, so the drawn values do not depend on the
+        order in which properties are drawn, on redraws of other properties
+        or on how the population is split up.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be drawn.
+        block : int
+            Index of the block of ``block_size`` person_ids.
+
+        Returns
+        -------
+        rng : numpy.random.Generator
+        """
+        spawn_key = (
+            int.from_bytes(property_name.encode(), "little"),
+            self._draw_counts.get(property_name, 0),
+            block,
+        )
+        seed_sequence = np.random.SeedSequence(
+            self.seed_sequence.entropy, spawn_key=spawn_key
+        )
+        return np.random.default_rng(seed_sequence)
+
+    def get_counter_rng(self, property_name, person_id):
+        """
+        Gets the counter-based random number generator of a property at a
+        person_id, for ``counter_based`` populations.
+
+        The generator is a Philox generator with a key derived from the
+        seed, the property and the number of draws of the property, and the
+        person_id as counter: the ``i``-th random number it generates is the
+        random number of person ``person_id + i``. Every person uses one
+        random number per draw of a property.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be drawn.
+        person_id : int
+            The person_id of the first person to be drawn.
+
+        Returns
+        -------
+        rng : numpy.random.Generator
+        """
+        seed_sequence = np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=(
+                int.from_bytes(property_name.encode(), "little"),
+                self._draw_counts.get(property_name, 0),
+            ),
+        )
+        # Philox generates four 64 bit numbers per counter value, each of
+        # which gives one random float.
+        rng = np.random.Generator(np.random.Philox(
+            key=seed_sequence.generate_state(2, np.uint64),
+            counter=person_id // 4,
+        ))
+        rng.random(person_id % 4)
+        return rng
+
+    def iter_blocks(self, property_name, positions=None):
+        """
+        Iterates over the blocks of person_ids in the population with their
+        random number generators for a property.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be drawn.
+        positions : NumPy array
+            Sorted positions in the population of the people to be drawn.
+            Defaults to None, which draws for everyone.
+
+        Yields
+        ------
+        start, stop : int
+            Index of the first and one past the last person in the block,
+            in the population or in ``positions``. Blocks without people
+            in ``positions`` are skipped.
+        rng : numpy.random.Generator
+            Random number generator for the property and block.
+        """
+        if self.counter_based:
+            # Every run of consecutive person_ids within a block starts at
+            # the counter of its first person.
+            person_ids = self.person_id
+            if positions is not None:
+                person_ids = person_ids[positions]
+            bounds = np.flatnonzero(
+                (np.diff(person_ids) != 1)
+                | (person_ids[1:] % self.block_size == 0)
+            ) + 1
+            starts = np.concatenate([[0], bounds]).tolist()
+            stops = np.concatenate([bounds, [person_ids.shape[0]]]).tolist()
+            for start, stop in zip(starts, stops):
+                if start < stop:
+                    yield start, stop, self.get_counter_rng(
+                        property_name, int(person_ids[start])
+                    )
+            return
+        if positions is not None:
+            blocks = (positions + self.first_person_id) // self.block_size
+            bounds = np.flatnonzero(np.diff(blocks)) + 1
+            starts = np.concatenate([[0], bounds]).tolist()
+            stops = np.concatenate([bounds, [blocks.shape[0]]]).tolist()
+            for start, stop in zip(starts, stops):
+                if start < stop:
+                    yield start, stop, self.get_rng(
+                        property_name, int(blocks[start])
+                    )
+            return
+        first_block = self.first_person_id // self.block_size
+        for start in range(0, self.popsize, self.block_size):
+            stop = min(start + self.block_size, self.popsize)
+            yield start, stop, self.get_rng(
+                property_name, first_block + start // self.block_size
+            )
+
+    def get_chunk(self, start, stop):
+        """
+        Gets an empty population for a range of person_ids, with the same
+        properties and random streams as this population.
+
+        Drawing all properties for the chunk gives the same values as the
+        next update of this population would for these person_ids.
+
+        Parameters
+        ----------
+        start, stop : int
+            First and one past the last person_id of the chunk. ``start``
+            should be a multiple of ``block_size``.
+
+        Returns
+        -------
+        chunk : PopulationClass
+        """
+        chunk = PopulationClass(stop - start, self.random_seed,
+                                self.block_size, first_person_id=start,
+                                threads=self.threads, metrics=self.metrics,
+                                counter_based=self.counter_based)
+        chunk.seed_sequence = self.seed_sequence
+        chunk._draw_counts = dict(self._draw_counts)
+        chunk.prob_objects = dict(self.prob_objects)
+        return chunk
+
+    def iter_chunks(self, chunk_size):
+        """
+        Generates the population in chunks of person_ids. Every chunk is
+        drawn for all properties, see ``update``.
+        With more than one worker, the chunks are drawn in parallel by the
+        worker processes and yielded in order.
+
+        Parameters
+        ----------
+        chunk_size : int
+            Number of people per chunk. Rounded up to a multiple of
+            ``block_size``, so the drawn values do not depend on the chunk
+            size.
+
+        Yields
+        ------
+        chunk : PopulationClass
+            Population for the chunk, with all properties drawn.
+        """
+        assert chunk_size >= 1, "Chunk size must be 1 or greater."
+        for prob_obj in self.prob_objects.values():
+            # Quotas taken per chunk would depend on the chunk size.
+            assert prob_obj.sampling != "quota", (
+                prob_obj.property_name
+                + ", quota sampling can not be used with chunks or more "
+                + "than one worker"
+            )
+        chunk_size = -(-chunk_size // self.block_size) * self.block_size
+        ranges = [
+            (start, min(start + chunk_size, self.popsize))
+            for start in range(0, self.popsize, chunk_size)
+        ]
+        if self.workers == 1:
+            for start, stop in ranges:
+                chunk = self.get_chunk(start, stop)
+                chunk.update()
+                yield chunk
+            return
+
+        # The workers receive the probability objects once; the chunks are
+        # sent without them. At most two chunks per worker are in flight, to
+        # bound the memory use.
+        with ProcessPoolExecutor(
+            self.workers,
+            initializer=_init_worker,
+            initargs=(self.prob_objects,),
+        ) as executor:
+            futures = deque()
+            for start, stop in ranges:
+                chunk = self.get_chunk(start, stop)
+                chunk.prob_objects = {}
+                chunk.metrics = None
+                futures.append(executor.submit(_draw_chunk, chunk))
+                if len(futures) >= 2 * self.workers:
+                    yield self._receive_chunk(futures.popleft())
+            while futures:
+                yield self._receive_chunk(futures.popleft())
+
+    def _receive_chunk(self, future):
+        """Waits for a chunk drawn by a worker and restores its properties."""
+        chunk = future.result()
+        chunk.prob_objects = dict(self.prob_objects)
+        chunk.metrics = self.metrics
+        return chunk
+
+    def stream(self, output, chunk_size, nowrite=False, file_format="csv"):
+        """
+        Generates the population in chunks and writes every chunk to file
+        before generating the next one, so only one chunk is kept in
+        memory. The file is identical to the one written by ``update``
+        followed by ``export``.
+
+        Parameters
+        ----------
+        output : string
+            Path and filename for the file.
+        chunk_size : int
+            Number of people per chunk, see ``iter_chunks``.
+        nowrite : boolean
+            If True, the population is generated but not written to file.
+            Defaults to False.
+        file_format : string
+            Format of the file, see ``export``. Defaults to 'csv'.
+        """
+        assert isinstance(output, str), "Filename should be of type string"
+        assert isinstance(nowrite, bool), \
+            "Argument nowrite should be of type boolean"
+        assert file_format in WRITERS, "Unknown file format " + file_format
+        writer = None if nowrite else WRITERS[file_format](output, self)
+        write_time = 0.0
+        for chunk in self.iter_chunks(chunk_size):
+            if writer is not None:
+                start_time = time.perf_counter()
+                writer.write(chunk)
+                write_time += time.perf_counter() - start_time
+        if writer is not None:
+            start_time = time.perf_counter()
+            writer.close()
+            write_time += time.perf_counter() - start_time
+            if self.metrics is not None:
+                self.metrics.record("export", write_time,
+                                    people=self.popsize,
+                                    nbytes=_output_size(output))
+        if nowrite:
+            print("Population is not written to disk.")
+        else:
+            print("Population is written to %s" % (output))
+
+    def _invalidate_masks(self, property_name):
+        """Removes the cached masks that depend on a (redrawn) property."""
+        for key in [k for k in self._mask_cache if k[0] == property_name]:
+            del self._mask_cache[key]
+
+    def get_condition_mask(self, property_name, relation, option,
+                           positions=None):
+        """
+        Gets the boolean mask of the people for which a property has a
+        certain relation to an option. Masks are cached until the property
+        is drawn again or the update ends, so a condition shared by multiple
+        properties is only evaluated once per update.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be compared.
+        relation : string
+            Relation as defined in the conditions file, e.g. ``eq``.
+        option : int or float
+            Option the property is compared to.
+        positions : NumPy array
+            Positions in the population of the people to be compared.
+            Defaults to None, which compares everyone. Masks for a subset
+            are taken from the cache if possible, but are not cached.
+
+        Returns
+        -------
+        mask : NumPy array
+            Boolean array that is True for the people satisfying the
+            relation. The array is shared with the cache and should not be
+            modified.
+        """
+        key = (property_name, relation, option)
+        if key in self._mask_cache:
+            mask = self._mask_cache[key]
+            return mask if positions is None else mask[positions]
+
+        values = self.columns[property_name]
+        if positions is not None:
+            values = values[positions]
+        mask = RELATIONS[relation](values, option)
+        # People without data do not satisfy any relation. For floats
+        # this already holds for NaN.
+        if values.dtype.kind in ["u", "i"]:
+            mask &= values != self._nodata[property_name]
+        if positions is None:
+            self._mask_cache[key] = mask
+        return mask
+
+    def _get_predicate_mask(self, predicate, positions=None):
+        """Combines the masks of a compiled condition with a logical and."""
+        return reduce(
+            np.logical_and,
+            [self.get_condition_mask(*cond, positions=positions)
+             for cond in predicate],
+        )
 
     def get_conditional_population(self, property_name, cond_index):
         """
@@ -145,65 +829,233 @@ class PopulationClass:
             DataFrame of the population that satisfies the condition.
         """
         prob_obj = self.prob_objects[property_name]
-        # - Get the corresponding condition from prob_obj.conditions
-        conds = prob_obj.conditions.query("condition_index == @cond_index")
-        # - Get the corr. segment of the population
-        # There can be multiple conditions.
-        # Combine them all in one query string
-        query_list = []
-        for index, row in conds.iterrows():
-            query_list.append(
-                construct_query_string(
-                    row["property_name"], row["option"], row["relation"]
-                )
-            )
-        query_string = " & ".join(query_list)
-        population_cond = self.population.query(query_string)
+        mask = self._get_predicate_mask(prob_obj.predicates[cond_index])
         # We're only interested in the ID's of the people.
-        population_cond = population_cond[["person_id"]]
+        population_cond = self.population.loc[mask, ["person_id"]]
         return population_cond
 
-    def export(self, output, nowrite=False):
+    def get_condition_cells(self, property_name, positions=None):
+        """
+        Assigns every person to the condition cell of a property.
+
+        If all conditions of the property are ``eq`` relations on discrete
+        properties, the codes of these properties are combined into a single
+        mixed-radix key per person, which selects the condition index from
+        a lookup table, see ``_get_cell_lookup``. This takes one pass over
+        the population per property in the conditions, whatever the number
+        of condition cells. Otherwise the mask of every condition index is
+        evaluated, which takes one pass per condition index.
+
+        Parameters
+        ----------
+        property_name : string
+            Name of property to be considered.
+        positions : NumPy array
+            Positions in the population of the people to be assigned.
+            Defaults to None, which assigns everyone.
+
+        Returns
+        -------
+        cells : NumPy array
+            Array with for every position in the population, or in
+            ``positions``, the condition index that applies to that person,
+            or -1 if none of the conditions apply. If multiple conditions
+            apply, the last one defined in the conditions file is used.
+        """
+        prob_obj = self.prob_objects[property_name]
+        size = self.popsize if positions is None else positions.shape[0]
+        lookup = self._get_cell_lookup(prob_obj)
+        if lookup is not None:
+            start_time = time.perf_counter()
+            keys = np.zeros(size, dtype=np.int64)
+            for dep, radix in zip(prob_obj.dependencies, lookup.shape):
+                values = self.columns[dep]
+                if positions is not None:
+                    values = values[positions]
+                keys *= radix
+                keys += values
+            cells = lookup.ravel()[keys]
+            if self.metrics is not None:
+                seconds = time.perf_counter() - start_time
+                people = np.bincount(cells[cells >= 0],
+                                     minlength=max(prob_obj.predicates) + 1)
+                # The time and memory of the single pass are divided over
+                # the condition indices by their number of people.
+                for cond_index in prob_obj.predicates:
+                    share = people[cond_index] / size
+                    self.metrics.record(
+                        "condition_cell", seconds * share,
+                        property_name=property_name, cond_index=cond_index,
+                        people=people[cond_index],
+                        nbytes=keys.nbytes * share,
+                    )
+            return cells
+
+        cells = np.full(size, -1, dtype=np.int64)
+        for cond_index, predicate in prob_obj.predicates.items():
+            start_time = time.perf_counter()
+            mask = self._get_predicate_mask(predicate, positions)
+            cells[mask] = cond_index
+            if self.metrics is not None:
+                self.metrics.record(
+                    "condition_cell", time.perf_counter() - start_time,
+                    property_name=property_name, cond_index=cond_index,
+                    people=np.count_nonzero(mask), nbytes=mask.nbytes,
+                )
+        return cells
+
+    def _get_cell_lookup(self, prob_obj):
+        """
+        Gets the table of condition indices per combination of codes of the
+        dependencies of a property, with an axis per dependency that
+        includes the code for missing data, and -1 for combinations without
+        a condition cell. None if the conditions are not all ``eq``
+        relations on discrete properties, or if the table would have more
+        than ``CELL_LOOKUP_SIZE`` entries.
+        """
+        if any(relation != "eq"
+               for predicate in prob_obj.predicates.values()
+               for _, relation, _ in predicate):
+            return None
+        if any(self.columns[dep].dtype.kind not in ["u", "i"]
+               for dep in prob_obj.dependencies):
+            return None
+        radices = tuple(int(self._nodata[dep]) + 1
+                        for dep in prob_obj.dependencies)
+        key = (prob_obj.property_name, radices)
+        if key in self._cell_lookups:
+            return self._cell_lookups[key]
+        if np.prod(radices, dtype=np.float64) > CELL_LOOKUP_SIZE:
+            return None
+
+        lookup = np.full(radices, -1, dtype=np.int64)
+        for cond_index, predicate in prob_obj.predicates.items():
+            # Dependencies that are not in the predicate match any code.
+            index = [slice(None)] * len(radices)
+            for prop, _, option in predicate:
+                axis = prob_obj.dependencies.index(prop)
+                # People without data, or with another code for the same
+                # property, do not satisfy the relation.
+                if (option != int(option)) or not (
+                    0 <= option < radices[axis] - 1
+                ) or (index[axis] not in [slice(None), int(option)]):
+                    break
+                index[axis] = int(option)
+            else:
+                lookup[tuple(index)] = cond_index
+        self._cell_lookups[key] = lookup
+        return lookup
+
+    def get_labelled_population(self, start=0, stop=None):
+        """
+        Gets (a range of) the population with the options of the discrete
+        properties replaced by their labels.
+
+        Parameters
+        ----------
+        start, stop : int
+            Positions in the population of the first and one past the last
+            person to include. Defaults to the whole population.
+
+        Returns
+        -------
+        population_w_labels : DataFrame
+        """
+        import pandas as pd
+
+        stop = self.popsize if stop is None else stop
+        population_w_labels = pd.DataFrame(
+            {"person_id": self.person_id[start:stop]}
+        )
+        for prop, values in self.columns.items():
+            if prop in self.labels:
+                # The code for missing data selects the 'nodata' label.
+                population_w_labels[prop] = self.labels[prop].take(
+                    values[start:stop]
+                )
+            else:
+                population_w_labels[prop] = values[start:stop]
+        return population_w_labels
+
+    def export(self, output, nowrite=False, print_population=False,
+               file_format="csv"):
         """
         Exports the generated population from PopulationClass.population. The
-        population can either be printed to screen or written to a CSV file.
+        population can either be printed to screen or written to a file.
 
         Parameters
         ----------
         output : string
-            Path and filename for the CSV file.
+            Path and filename for the file.
         nowrite : boolean
             If True, the population will only be printed to the command line
             and not written to file. Defaults to False.
+        print_population : boolean
+            If True, the population is printed to the command line also when
+            it is written to file. Defaults to False.
+        file_format : string
+            Format of the file, one of the keys of
+            ``simago.writers.WRITERS``: 'csv', 'parquet' or 'npy'. Defaults
+            to 'csv'. For 'npy', ``output`` is a directory, see
+            ``load_population``.
         """
-        # Replace the options with the labels
         assert isinstance(output, str), "Filename should be of type string"
         assert isinstance(nowrite, bool), \
             "Argument nowrite should be of type boolean"
-        population_w_labels = self.population.copy()
+        assert file_format in WRITERS, "Unknown file format " + file_format
 
-        for prob_obj in self.prob_objects.values():
-            if prob_obj.data_type in ["categorical", "ordinal"]:
-                prop = prob_obj.property_name
-                population_w_labels[prop] = population_w_labels[prop]\
-                    .apply(lambda idx: 'nodata' if np.isnan(idx)
-                           else prob_obj.labels[int(idx)])
-
-        print("------------------------")
-        print("Generated population:")
-        print(population_w_labels)
+        if nowrite or print_population:
+            print("------------------------")
+            print("Generated population:")
+            print(self.get_labelled_population())
 
         print("------------------------")
         # Export population.population
         if nowrite:
             print("Population is not written to disk.")
-            pass
         else:
-            population_w_labels.to_csv(path_or_buf=output, index=False)
+            start_time = time.perf_counter()
+            writer = WRITERS[file_format](output, self)
+            writer.write(self)
+            writer.close()
+            if self.metrics is not None:
+                self.metrics.record("export", time.perf_counter() - start_time,
+                                    people=self.popsize,
+                                    nbytes=_output_size(output))
             print("Population is written to %s" % (output))
 
 
-def generate_population(popsize, yaml_folder, rand_seed=None):
+def _output_size(output):
+    """Number of bytes in a written file or directory."""
+    if os.path.isdir(output):
+        return sum(os.path.getsize(os.path.join(output, filename))
+                   for filename in os.listdir(output))
+    return os.path.getsize(output)
+
+
+# Probability objects of the worker processes, see PopulationClass.workers.
+_worker_prob_objects = {}
+
+
+def _init_worker(prob_objects):
+    """Stores the probability objects in a worker process."""
+    global _worker_prob_objects
+    _worker_prob_objects = prob_objects
+
+
+def _draw_chunk(chunk):
+    """Draws all properties of a chunk in a worker process."""
+    chunk.prob_objects = dict(_worker_prob_objects)
+    chunk.update()
+    # Only the drawn columns are sent back.
+    chunk.prob_objects = {}
+    chunk._mask_cache = {}
+    return chunk
+
+
+def generate_population(popsize, yaml_folder, rand_seed=None, workers=1,
+                        threads=1, cache_file=None, metrics=None,
+                        counter_based=False):
     """
     Generate population.
 
@@ -215,6 +1067,21 @@ def generate_population(popsize, yaml_folder, rand_seed=None):
         Folder with settings YAML files.
     random_seed : int
         Seed for random number generation.
+    workers : int
+        Number of worker processes used to draw the population. The drawn
+        population does not depend on the number of workers. Defaults to 1.
+    threads : int
+        Number of threads used to draw independent properties at the same
+        time. Defaults to 1.
+    cache_file : string
+        File in which the ProbabilityClass objects are cached, see
+        ``load_probab_objects``. Defaults to None, which does not cache.
+    metrics : simago.metrics.Metrics
+        Object in which the time and memory use of loading the settings and
+        of the population is recorded. Defaults to None.
+    counter_based : bool
+        Draw with counter-based random numbers per person_id, see
+        ``PopulationClass.get_person``. Defaults to False.
 
     Returns
     -------
@@ -226,12 +1093,64 @@ def generate_population(popsize, yaml_folder, rand_seed=None):
         print("No random seed defined")
     else:
         print("Random seed: %d" % (rand_seed))
-    np.random.seed(rand_seed)
 
     print("------------------------")
+    probab_objects = load_probab_objects(yaml_folder, cache_file, metrics)
+
+    # Generate an empty population
+    population = PopulationClass(popsize, rand_seed, workers=workers,
+                                 threads=threads, metrics=metrics,
+                                 counter_based=counter_based)
+
+    # Add variables to the population based on the ProbabilityClass instances.
+    for obj in probab_objects:
+        population.add_property(obj)
+
+    return population
+
+
+def load_probab_objects(yaml_folder, cache_file=None, metrics=None):
+    """
+    Loads and checks the settings files in a folder and creates the
+    ProbabilityClass objects, ordered by their dependencies.
+
+    With a cache file, the objects are read from the cache if it was written
+    for the same contents of the settings, data, conditions and pdf files.
+    Otherwise the objects are created and the cache is (re)written.
+
+    Parameters
+    ----------
+    yaml_folder : string
+        Folder with settings YAML files.
+    cache_file : string
+        File in which the objects are cached. Defaults to None, which does
+        not cache.
+    metrics : simago.metrics.Metrics
+        Object in which the time of loading and compiling the settings is
+        recorded. Defaults to None.
+
+    Returns
+    -------
+    probab_objects : list of ProbabilityClass objects
+    """
+    start_time = time.perf_counter()
     # Gather YAML files for aggregated data
     yaml_filenames = find_yamls(yaml_folder)
+    if cache_file is not None:
+        key = hash_settings(yaml_filenames)
+        probab_objects = read_cache(cache_file, key)
+        if probab_objects is not None:
+            if metrics is not None:
+                metrics.record("load", time.perf_counter() - start_time)
+            print("------------------------")
+            print("Properties loaded from cache %s:" % (cache_file))
+            print([obj.property_name for obj in probab_objects])
+            return probab_objects
+
     yaml_objects = load_yamls(yaml_filenames)
+    if metrics is not None:
+        metrics.record("load", time.perf_counter() - start_time)
+    start_time = time.perf_counter()
 
     # Based on the yaml_objects, create a list of ProbabilityClass instances.
     probab_objects = []
@@ -248,14 +1167,62 @@ def generate_population(popsize, yaml_folder, rand_seed=None):
     check_comb_conditions(probab_objects)
 
     probab_objects = order_probab_objects(probab_objects)
+    if metrics is not None:
+        metrics.record("compile", time.perf_counter() - start_time)
 
-    # Generate an empty population
-    population = PopulationClass(popsize, rand_seed)
+    if cache_file is not None:
+        write_cache(cache_file, key, probab_objects)
+    return probab_objects
 
-    # Add variables to the population based on the ProbabilityClass instances.
-    for obj in probab_objects:
-        population.add_property(obj)
 
+def load_population(path):
+    """
+    Loads a population written with ``file_format="npy"``. The columns are
+    memory-mapped from their ``.npy`` files instead of read into memory, so
+    loading takes the same time for any population size and processes that
+    load the same population share its pages in memory.
+
+    Parameters
+    ----------
+    path : string
+        Directory with the ``.npy`` files and the manifest.
+
+    Returns
+    -------
+    PopulationClass object
+        Population with read-only columns, labels and random streams of the
+        written population, without ProbabilityClass objects.
+
+    """
+    assert os.path.isfile(os.path.join(path, MANIFEST)), \
+        "No manifest found in " + path
+    with open(os.path.join(path, MANIFEST)) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    population = PopulationClass(
+        manifest["popsize"],
+        manifest["random_seed"],
+        manifest["block_size"],
+        first_person_id=manifest["first_person_id"],
+        counter_based=manifest.get("counter_based", False),
+    )
+    population.seed_sequence = np.random.SeedSequence(manifest["entropy"])
+    population._draw_counts = manifest["draw_counts"]
+    population._partial_draws = set(manifest.get("partial_draws", []))
+    for prop in manifest["properties"]:
+        name = prop["property_name"]
+        population.columns[name] = np.load(
+            os.path.join(path, name + ".npy"), mmap_mode="r"
+        )
+        assert population.columns[name].shape == (population.popsize,), \
+            "Column " + name + " does not match the population size."
+        if prop["labels"] is None:
+            population._nodata[name] = np.nan
+        else:
+            population._nodata[name] = prop["nodata"]
+            population.labels[name] = np.array(
+                prop["labels"] + ["nodata"], dtype=object
+            )
     return population
 
 
@@ -288,7 +1255,7 @@ def construct_query_string(property_name, option, relation):
     elif relation == "gr":
         relation_string = ">"
     elif relation == "neq":
-        relation_string = "~="
+        relation_string = "!="
 
     query_list = [property_name, relation_string, str(option)]
     query_string = " ".join(query_list)
@@ -5,11 +5,61 @@ import importlib
 import os
 
 from abc import ABC
+from collections import namedtuple
 
 import numpy as np
-import pandas as pd
 
-from scipy import stats
+
+# pandas and scipy.stats take most of the time to import simago; they are
+# imported in the functions that use them instead.
+
+
+# NumPy comparisons for the relations that can be used in conditions files.
+RELATIONS = {
+    "eq": np.equal,
+    "neq": np.not_equal,
+    "leq": np.less_equal,
+    "geq": np.greater_equal,
+    "le": np.less,
+    "gr": np.greater,
+}
+
+AliasTable = namedtuple("AliasTable", ["options", "prob", "alias"])
+AliasTable.__doc__ = """
+Alias table for sampling from a discrete distribution with Walker's alias
+method, see ``build_alias_table``.
+"""
+
+CDFTable = namedtuple("CDFTable", ["options", "cumprobs", "offsets", "keys"])
+CDFTable.__doc__ = """
+Cumulative distributions of all condition indices of a discrete property,
+stacked in a CSR-like layout, with the search keys of
+``draw_from_cdf_table``, see ``build_cdf_table``.
+"""
+
+FamilyTable = namedtuple("FamilyTable", ["name", "shapes", "loc", "scale"])
+FamilyTable.__doc__ = """
+Parameters per condition index of continuous distributions of a single
+family that can be drawn with NumPy, see ``build_family_table``.
+"""
+
+
+def _lognorm_standard(rng, shapes, size):
+    """Standard lognormal variates with shape parameter s."""
+    return np.exp(shapes[0] * rng.standard_normal(size))
+
+
+# Draws from the standardized distribution (loc 0, scale 1) of the scipy.stats
+# families that are drawn directly with a numpy.random.Generator. The shape
+# parameters are given per person.
+NUMPY_FAMILIES = {
+    "norm": lambda rng, shapes, size: rng.standard_normal(size),
+    "lognorm": _lognorm_standard,
+    "gamma": lambda rng, shapes, size: rng.standard_gamma(shapes[0], size),
+    "expon": lambda rng, shapes, size: rng.standard_exponential(size),
+    "uniform": lambda rng, shapes, size: rng.random(size),
+    "beta": lambda rng, shapes, size: rng.beta(shapes[0], shapes[1], size),
+}
 
 
 class ProbabilityClass(ABC):
@@ -28,15 +78,31 @@ class ProbabilityClass(ABC):
     property_name : string
         Unique name of property.
     data_type : string
+    dtype : numpy.dtype
+        Data type of the drawn values.
+    sampling : string
+        Method for drawing the values, see the ``draw_values`` methods.
+    nodata : int or float
+        Value for people for which none of the conditions hold.
     conditions : DataFrame
+    predicates : dict
+        Compiled conditions; maps every condition index to a list of
+        ``(property_name, relation, option)`` tuples that must all hold.
+    dependencies : list
+        Names of the properties referenced in the conditions, i.e. the
+        properties that should be drawn before this property.
 
     """
     def __init__(self, yaml_object):
         self.property_name = yaml_object["property_name"]
         self.data_type = yaml_object["data_type"]
+        self.dtype = yaml_object["dtype"]
+        self.sampling = yaml_object["sampling"]
 
         if yaml_object["conditions"] is None:
             self.conditions = None
+            self.predicates = None
+            self.dependencies = []
         else:
             self.read_conditions(yaml_object["conditions"])
 
@@ -49,6 +115,8 @@ class ProbabilityClass(ABC):
         conditions_file : string
             Filename for the CSV file.
         """
+        import pandas as pd
+
         self.conditions = pd.read_csv(conditions_file)
         assert sorted(self.conditions.columns.tolist()) == sorted(
             [
@@ -61,6 +129,30 @@ class ProbabilityClass(ABC):
             str(self.property_name) + ", "
             "Conditions file does not contain the necessary columns"
         )
+        assert self.conditions.relation.isin(RELATIONS.keys()).all(), (
+            str(self.property_name) + ", "
+            "Conditions file contains an invalid relation"
+        )
+        self.compile_conditions()
+
+    def compile_conditions(self):
+        """
+        Compiles the conditions to predicates that can be evaluated as
+        boolean masks on the population, see
+        ``PopulationClass.get_condition_mask``.
+        """
+        self.predicates = {}
+        for cond_index, conds in self.conditions.groupby(
+            "condition_index", sort=False
+        ):
+            self.predicates[cond_index] = list(
+                zip(
+                    conds["property_name"].tolist(),
+                    conds["relation"].tolist(),
+                    conds["option"].tolist(),
+                )
+            )
+        self.dependencies = self.conditions["property_name"].unique().tolist()
 
 
 class DiscreteProbabilityClass(ProbabilityClass):
@@ -72,6 +164,22 @@ class DiscreteProbabilityClass(ProbabilityClass):
         super(DiscreteProbabilityClass, self).__init__(yaml_object)
 
         self.read_data(yaml_object["data_file"])
+        # The options are stored as codes, with one code past the last
+        # option for people without data. Without a declared dtype, the
+        # smallest unsigned integer type that fits all codes is used.
+        self.nodata = len(self.labels)
+        if self.dtype is None:
+            self.dtype = np.min_scalar_type(self.nodata)
+        else:
+            self.dtype = np.dtype(self.dtype)
+            assert self.dtype.kind in ["u", "i"] and (
+                np.iinfo(self.dtype).max >= self.nodata
+            ), (
+                self.property_name
+                + ", dtype "
+                + str(self.dtype)
+                + " is too small for the amount of options"
+            )
         self.generate_probabilities()
 
     def read_data(self, data_file):
@@ -82,6 +190,8 @@ class DiscreteProbabilityClass(ProbabilityClass):
         data_file : string
             Filename for the CSV file.
         """
+        import pandas as pd
+
         data_frame = pd.read_csv(data_file)
         assert sorted(data_frame.columns.tolist()) == sorted(
             [
@@ -103,6 +213,9 @@ class DiscreteProbabilityClass(ProbabilityClass):
             self.labels[options_labels.at[idx, "option"]] = options_labels.at[
                 idx, "label"
             ]
+        # Array of the labels per option code, with the 'nodata' label at the
+        # code for missing data, see ``nodata``.
+        self.label_array = np.array(self.labels + ["nodata"], dtype=object)
 
         # Assign the data to self.data
         self.data = (
@@ -113,6 +226,8 @@ class DiscreteProbabilityClass(ProbabilityClass):
 
     def generate_probabilities(self):
         """Convert the data to a discrete probability distribution."""
+        import pandas as pd
+
         # From the data generate the probabilities
         self.probabs = self.data.copy()
         sum_values = (
@@ -130,74 +245,96 @@ class DiscreteProbabilityClass(ProbabilityClass):
         self.probabs = self.probabs.drop("value_sum", axis=1)
         self.probabs = self.probabs.rename(columns={"value": "probab"})
 
-    def draw_values(self, pop_obj):
+        # Compile the probabilities once, so drawing does not have to look
+        # up the distribution of every condition again.
+        self.cdf_table = build_cdf_table(self.probabs)
+        self.cdf_table = self.cdf_table._replace(
+            options=self.cdf_table.options.astype(self.dtype)
+        )
+        if self.conditions is None:
+            # Without conditions there is a single distribution, for which
+            # the alias method is O(1) per person.
+            self.alias_table = build_alias_table(
+                self.probabs.option.values.astype(self.dtype),
+                self.probabs.probab.values,
+            )
+        else:
+            self.alias_table = None
+            missing = set(self.predicates) - set(self.probabs.condition_index)
+            assert not missing, (
+                self.property_name
+                + ", no data for condition indices "
+                + str(sorted(missing))
+            )
+
+    def draw_values(self, pop_obj, positions=None):
         """
         Draw values for discrete, i.e. categorical and ordinal, variables.
 
+        With ``sampling: quota`` every condition cell gets the exact number
+        of people per option, see ``draw_from_quota``, instead of a random
+        draw per person.
+
         Parameters
         ----------
         pop_obj : PopulationClass
+        positions : NumPy array
+            Sorted positions in the population of the people to draw values
+            for. Defaults to None, which draws for everyone.
 
         Returns
         -------
-        population: DataFrame
-            DataFrame containing (new) column for the property with
-            newly drawn values.
+        values : NumPy array
+            Newly drawn values for the property, for every person in the
+            population or in ``positions``.
 
         """
-        population = pop_obj.population
-
-        if self.conditions is None:
-            population[
+        size = pop_obj.popsize if positions is None else positions.shape[0]
+        values = np.full(size, self.nodata, dtype=self.dtype)
+        if self.sampling == "quota":
+            # The quotas are taken over everyone that is drawn, so they are
+            # drawn with a single stream instead of one per block.
+            assert not pop_obj.counter_based, (
                 self.property_name
-            ] = draw_from_disc_distribution(
-                self.probabs, pop_obj.population.shape[0], pop_obj.random_seed
+                + ", quota sampling can not be used with counter-based "
+                + "random numbers"
             )
-        # Iterate over the various conditions.
-        else:
-            for cond_index in self.conditions.condition_index.unique():
-                # For every condition:
-                # - Get the corresponding condition from
-                #     self.conditions
-                # - Get the corr. segment of the population
-                # - Draw the values
-                # - Write the values in a list to the correct places
-
-                # - Get the corr. conditional probabilities from self.probabs
-                probabs_df = self.probabs.query(
-                    "condition_index == @cond_index"
-                )
-                # - Get the corr. segment of the population
-                population_cond = pop_obj.get_conditional_population(
-                    self.property_name, cond_index
+            if self.conditions is None:
+                cells = np.zeros(size, dtype=np.int64)
+            else:
+                cells = pop_obj.get_condition_cells(self.property_name,
+                                                    positions)
+            has_cell = cells >= 0
+            values[has_cell] = draw_from_quota(
+                self.cdf_table, cells[has_cell],
+                pop_obj.get_rng(self.property_name),
+            )
+            return values
+        blocks = pop_obj.iter_blocks(self.property_name, positions)
+        if self.conditions is None:
+            for start, stop, rng in blocks:
+                values[start:stop] = draw_from_alias_table(
+                    self.alias_table, stop - start, rng
                 )
-
-                # - Draw the values
-                population_cond[
-                    self.property_name
-                ] = draw_from_disc_distribution(
-                    probabs_df, population_cond.shape[0], pop_obj.random_seed
+        else:
+            # Give every person their condition cell in one pass, then draw
+            # the values for all cells at once from the stacked CDFs.
+            cells = pop_obj.get_condition_cells(self.property_name, positions)
+            for start, stop, rng in blocks:
+                block_cells = cells[start:stop]
+                has_cell = block_cells >= 0
+                if pop_obj.counter_based:
+                    # People without a cell use their random number as well,
+                    # so the value of a person does not depend on who else
+                    # is drawn.
+                    values[start:stop][has_cell] = draw_from_cdf_table(
+                        self.cdf_table, np.maximum(block_cells, 0), rng
+                    )[has_cell]
+                    continue
+                values[start:stop][has_cell] = draw_from_cdf_table(
+                    self.cdf_table, block_cells[has_cell], rng
                 )
-
-                # - Write the values in a list to the correct places
-                # Use a left join for this
-                if self.property_name not in population.columns.values:
-                    population = pd.merge(
-                        population,
-                        population_cond,
-                        how="left",
-                        on="person_id",
-                    )
-                else:
-                    # If the column already exists, update the values in that
-                    # column. A couple of index tricks are necessary to arrange
-                    # that.
-                    population = population.set_index("person_id")
-                    population_cond = population_cond.set_index("person_id")
-                    population_cond = population_cond[[self.property_name]]
-                    population.update(population_cond)
-                    population.reset_index(inplace=True, drop=False)
-        return population
+        return values
 
 
 class ContinuousProbabilityClass(ProbabilityClass):
@@ -206,79 +343,394 @@ class ContinuousProbabilityClass(ProbabilityClass):
     properties with continuous probability distributions.
     """
     def __init__(self, yaml_object):
+        from scipy import stats
+
         super(ContinuousProbabilityClass, self).__init__(yaml_object)
 
+        self.nodata = np.nan
+        self.dtype = np.dtype(
+            np.float64 if self.dtype is None else self.dtype
+        )
+
         self.pdf_parameters = yaml_object["pdf_parameters"]
-        # Execute the pdf file to define the pdf function
-        pdf_relpath = os.path.relpath(yaml_object["pdf_file"])
-        module_name = pdf_relpath[:-3].replace("/", ".")
-        imported_pdfs = importlib.import_module(module_name)
-        pdf_function = getattr(imported_pdfs, yaml_object["pdf"])
-        self.pdf = pdf_function
+        self.pdf_file = yaml_object["pdf_file"]
+        self.pdf_name = yaml_object["pdf"]
+        self._pdf = None
         # Check that self.pdf returns a frozen rv_continuous object.
         pdf_return = self.pdf(self.pdf_parameters[0])
         assert isinstance(pdf_return,
                           stats._distn_infrastructure.rv_frozen), \
             self.property_name + ", pdf does not return frozen rv_continuous"
+        # With a quantile table, or for distributions of a family in
+        # NUMPY_FAMILIES, all condition cells are drawn at once; others are
+        # drawn per cell with scipy.
+        frozen_rvs = [self.pdf(parameters)
+                      for parameters in self.pdf_parameters]
+        if self.sampling == "quantile_table":
+            self.quantile_table = build_quantile_table(
+                frozen_rvs, yaml_object["quantile_grid"]
+            )
+            self.family_table = None
+        else:
+            self.quantile_table = None
+            self.family_table = build_family_table(frozen_rvs)
 
-    def draw_values(self, pop_obj):
+    @property
+    def pdf(self):
+        """
+        The pdf function from the pdf file. The pdf file is imported on
+        first use, so an unpickled object that does not need it, e.g. one
+        drawn with a quantile table, does not import it.
+        """
+        if self._pdf is None:
+            # Execute the pdf file to define the pdf function
+            pdf_relpath = os.path.relpath(self.pdf_file)
+            module_name = pdf_relpath[:-3].replace("/", ".")
+            imported_pdfs = importlib.import_module(module_name)
+            self._pdf = getattr(imported_pdfs, self.pdf_name)
+        return self._pdf
+
+    def __getstate__(self):
+        """Pickles the object without the pdf function, see ``pdf``."""
+        state = self.__dict__.copy()
+        state["_pdf"] = None
+        return state
+
+    def draw_values(self, pop_obj, positions=None):
         """
         Draw values for continuous variables.
 
         Parameters
         ----------
         pop_obj : PopulationClass
+        positions : NumPy array
+            Sorted positions in the population of the people to draw values
+            for. Defaults to None, which draws for everyone.
 
         Returns
         -------
-        population: DataFrame
-            DataFrame containing (new) column for the property with
-            newly drawn values.
+        values : NumPy array
+            Newly drawn values for the property, for every person in the
+            population or in ``positions``.
 
         """
-        population = pop_obj.population
-
+        size = pop_obj.popsize if positions is None else positions.shape[0]
         if self.conditions is None:
-            population[self.property_name] = draw_from_cont_distribution(
-                self.pdf,
-                self.pdf_parameters[0],
-                population.shape[0],
-                pop_obj.random_seed,
-            )
+            cells = np.zeros(size, dtype=np.int64)
         else:
-            for cond_index in self.conditions.condition_index.unique():
-                # For every condition:
-                # - Get the corr. segment of the population
-                # - Draw the values
-                # - Write the values in a list to the correct places
-
-                population_cond = pop_obj.get_conditional_population(
-                    self.property_name, cond_index
+            cells = pop_obj.get_condition_cells(self.property_name, positions)
+        values = np.full(cells.shape[0], self.nodata, dtype=self.dtype)
+        for start, stop, rng in pop_obj.iter_blocks(self.property_name,
+                                                    positions):
+            block_cells = cells[start:stop]
+            has_cell = block_cells >= 0
+            if pop_obj.counter_based:
+                # One random number per person, also for people without a
+                # cell, transformed with the quantile function.
+                if self.quantile_table is not None:
+                    drawn = draw_from_quantile_table(
+                        self.quantile_table, np.maximum(block_cells, 0), rng
+                    )
+                else:
+                    drawn = draw_from_ppf(self.pdf, self.pdf_parameters,
+                                          block_cells, rng)
+                values[start:stop][has_cell] = drawn[has_cell]
+                continue
+            if self.quantile_table is not None:
+                values[start:stop][has_cell] = draw_from_quantile_table(
+                    self.quantile_table, block_cells[has_cell], rng
+                )
+                continue
+            if self.family_table is not None:
+                values[start:stop][has_cell] = draw_from_family_table(
+                    self.family_table, block_cells[has_cell], rng
                 )
-                population_cond[
-                    self.property_name
-                ] = draw_from_cont_distribution(
+                continue
+            for cond_index, cell_positions in split_condition_cells(
+                cells[start:stop]
+            ):
+                values[start + cell_positions] = draw_from_cont_distribution(
                     self.pdf,
                     self.pdf_parameters[cond_index],
-                    population_cond.shape[0],
-                    pop_obj.random_seed,
+                    cell_positions.shape[0],
+                    rng,
                 )
-                # - Write the values in a list to the correct places
-                # Use a left join for this
-                if self.property_name not in population.columns.values:
-                    population = pd.merge(
-                        population, population_cond, how="left", on="person_id"
-                    )
-                else:
-                    # If the column already exists, update the values in that
-                    # column.
-                    # Couple of index tricks are necessary to arrange that.
-                    population = population.set_index("person_id")
-                    population_cond = population_cond.set_index("person_id")
-                    population_cond = population_cond[[self.property_name]]
-                    population.update(population_cond)
-                    population.reset_index(inplace=True, drop=False)
-        return population
+        return values
+
+
+def split_condition_cells(cells):
+    """
+    Groups the positions in the population by condition cell.
+
+    The cells are sorted with a stable radix sort where possible, so the
+    grouping scales linearly with the size of the population.
+
+    Parameters
+    ----------
+    cells : NumPy array
+        Condition index per person, -1 for people without a condition cell.
+
+    Yields
+    ------
+    cond_index : int
+        Condition index of the cell.
+    positions : NumPy array
+        Positions in the population of the people in the cell, in ascending
+        order.
+    """
+    if cells.shape[0] == 0:
+        return
+    keys = cells + 1
+    if keys.max() < np.iinfo(np.uint16).max:
+        # NumPy uses radix sort for stable sorts of 16 bit integers.
+        keys = keys.astype(np.uint16)
+    order = np.argsort(keys, kind="stable")
+    counts = np.bincount(keys)
+    bounds = np.cumsum(counts)
+    # Skip the people without a condition cell at key 0.
+    for key in np.flatnonzero(counts[1:]) + 1:
+        yield key - 1, order[bounds[key - 1]:bounds[key]]
+
+
+def build_alias_table(options, probabs):
+    """
+    Build an alias table for a discrete distribution with Vose's variant of
+    Walker's alias method.
+
+    Parameters
+    ----------
+    options : array_like
+        Options of the discrete distribution.
+    probabs : array_like
+        Probability for each of the options.
+
+    Returns
+    -------
+    alias_table : AliasTable
+        Alias table with for every slot the probability of drawing the option
+        in that slot and the slot of its alias otherwise.
+
+    """
+    options = np.asarray(options)
+    probabs = np.asarray(probabs, dtype=np.float64)
+    num_options = probabs.shape[0]
+    scaled = probabs * (num_options / probabs.sum())
+    prob = np.ones(num_options)
+    alias = np.arange(num_options)
+
+    small = np.flatnonzero(scaled < 1.0).tolist()
+    large = np.flatnonzero(scaled >= 1.0).tolist()
+    while small and large:
+        less = small.pop()
+        more = large[-1]
+        prob[less] = scaled[less]
+        alias[less] = more
+        scaled[more] = (scaled[more] + scaled[less]) - 1.0
+        if scaled[more] < 1.0:
+            small.append(large.pop())
+    # Slots left over due to rounding errors keep probability one.
+    return AliasTable(options, prob, alias)
+
+
+def draw_from_alias_table(alias_table, size, random_seed):
+    """
+    Draw from a discrete distribution using its alias table.
+
+    Parameters
+    ----------
+    alias_table : AliasTable
+        Alias table of the distribution, see ``build_alias_table``.
+    size : int
+        Number of values drawn from distribution.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    # A single uniform draw picks the slot with its integer part and decides
+    # between the slot and its alias with its fractional part.
+    uniforms = rng.random(size) * alias_table.prob.shape[0]
+    slots = uniforms.astype(np.intp)
+    uniforms -= slots
+    slots = np.where(
+        uniforms < alias_table.prob[slots], slots, alias_table.alias[slots]
+    )
+    drawn_values = alias_table.options[slots]
+    return drawn_values
+
+
+def build_cdf_table(probabs):
+    """
+    Stack the cumulative distributions of all condition indices of a
+    discrete probability distribution.
+
+    The options and cumulative probabilities of condition index ``c`` are
+    found at the positions ``offsets[c]`` up to ``offsets[c + 1]``. The
+    keys are the cumulative probabilities shifted to the interval
+    ``(c, c + 1]``, so one search finds the option for people in different
+    condition cells.
+
+    Parameters
+    ----------
+    probabs : Pandas DataFrame
+        DataFrame containing the discrete probability distribution per
+        condition index.
+
+    Returns
+    -------
+    cdf_table : CDFTable
+        Stacked options, cumulative probabilities and offsets.
+
+    """
+    probabs = probabs.sort_values("condition_index", kind="stable")
+    cond_indices = probabs.condition_index.values
+    counts = np.bincount(cond_indices)
+    offsets = np.zeros(counts.shape[0] + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Cumulative sums per condition index, with the last value of each
+    # condition fixed at exactly one.
+    cumprobs = (
+        probabs.groupby("condition_index").probab.cumsum().to_numpy(copy=True)
+    )
+    cumprobs[offsets[1:][counts > 0] - 1] = 1.0
+    keys = cumprobs + np.repeat(np.arange(counts.shape[0]), counts)
+    return CDFTable(probabs.option.values, cumprobs, offsets, keys)
+
+
+def draw_from_cdf_table(cdf_table, cells, random_seed):
+    """
+    Draw from the stacked discrete distributions of a property for people
+    in different condition cells with a single search.
+
+    Parameters
+    ----------
+    cdf_table : CDFTable
+        Stacked distributions, see ``build_cdf_table``.
+    cells : NumPy array
+        Condition index per person.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    targets = cells + rng.random(cells.shape[0])
+    positions = np.searchsorted(cdf_table.keys, targets, side="right")
+    # For large condition indices the target can round up to c + 1, past
+    # the last option of the cell.
+    np.minimum(positions, cdf_table.offsets[cells + 1] - 1, out=positions)
+    drawn_values = cdf_table.options[positions]
+    return drawn_values
+
+
+def get_cdf_table_probabs(cdf_table):
+    """
+    Gets the probabilities of the options from a stacked CDF table.
+
+    Parameters
+    ----------
+    cdf_table : CDFTable
+        Stacked distributions, see ``build_cdf_table``.
+
+    Returns
+    -------
+    probabs : NumPy array
+        Probability per option and condition index, in the layout of
+        ``cdf_table``.
+
+    """
+    starts = cdf_table.offsets[:-1][np.diff(cdf_table.offsets) > 0]
+    probabs = np.diff(cdf_table.cumprobs, prepend=0.0)
+    probabs[starts] = cdf_table.cumprobs[starts]
+    return probabs
+
+
+def allocate_quota(cdf_table, cell_counts):
+    """
+    Divide the people of every condition cell over the options of a
+    discrete property, in proportion to the probabilities and rounded with
+    the largest remainder method.
+
+    Parameters
+    ----------
+    cdf_table : CDFTable
+        Stacked distributions, see ``build_cdf_table``.
+    cell_counts : NumPy array
+        Number of people per condition index.
+
+    Returns
+    -------
+    counts : NumPy array
+        Number of people per option and condition index, in the layout of
+        ``cdf_table``.
+
+    """
+    num_cells = cdf_table.offsets.shape[0] - 1
+    entry_cells = np.repeat(np.arange(num_cells), np.diff(cdf_table.offsets))
+    probabs = get_cdf_table_probabs(cdf_table)
+
+    quotas = probabs * cell_counts[entry_cells]
+    counts = np.floor(quotas).astype(np.int64)
+    remainders = cell_counts - np.bincount(
+        entry_cells, weights=counts, minlength=num_cells
+    ).astype(np.int64)
+    # The people left after rounding down go to the options with the
+    # largest fractions, one each; ties go to the first option.
+    order = np.lexsort((counts - quotas, entry_cells))
+    ranks = np.arange(order.shape[0]) - cdf_table.offsets[entry_cells[order]]
+    counts[order[ranks < remainders[entry_cells[order]]]] += 1
+    return counts
+
+
+def draw_from_quota(cdf_table, cells, random_seed):
+    """
+    Draw from the stacked discrete distributions of a property with exact
+    counts: the people of every condition cell are divided over the options
+    with ``allocate_quota`` and the options are assigned in a random order
+    within each cell.
+
+    Parameters
+    ----------
+    cdf_table : CDFTable
+        Stacked distributions, see ``build_cdf_table``.
+    cells : NumPy array
+        Condition index per person.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    num_cells = cdf_table.offsets.shape[0] - 1
+    counts = allocate_quota(
+        cdf_table, np.bincount(cells, minlength=num_cells)
+    )
+    # A stable sort by cell of randomly permuted people gives a random
+    # order of the people of every cell, which are filled with the options
+    # of the cell in order.
+    permutation = rng.permutation(cells.shape[0])
+    keys = cells[permutation]
+    if num_cells < np.iinfo(np.uint16).max:
+        # NumPy uses radix sort for stable sorts of 16 bit integers.
+        keys = keys.astype(np.uint16)
+    order = permutation[np.argsort(keys, kind="stable")]
+    drawn_values = np.empty(cells.shape[0], dtype=cdf_table.options.dtype)
+    drawn_values[order] = np.repeat(cdf_table.options, counts)
+    return drawn_values
 
 
 def draw_from_disc_distribution(probabs, size, random_seed):
@@ -291,21 +743,19 @@ def draw_from_disc_distribution(probabs, size, random_seed):
         DataFrame containing the discrete probability distribution.
     size : int
         Number of values drawn from distribution.
-    random_seed : int
-        Seed for random number generation.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
 
     Returns
     -------
-    drawn_values : list
-        List of drawn values.
+    drawn_values : NumPy array
+        Array of drawn values.
 
     """
-
-    sample_rv = stats.rv_discrete(
-        name="sample_rv", values=(probabs.option, probabs.probab)
+    alias_table = build_alias_table(
+        probabs.option.values, probabs.probab.values
     )
-    sample_num = sample_rv.rvs(size=size)
-    drawn_values = probabs.option.values[sample_num]
+    drawn_values = draw_from_alias_table(alias_table, size, random_seed)
     return drawn_values
 
 
@@ -321,35 +771,291 @@ def draw_from_cont_distribution(pdf, parameters, size, random_seed):
         List of parameters for the probability distribution function.
     size : int
         Number of values drawn from distribution.
-    random_seed : int
-        Seed for random number generation.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
 
     Returns
     -------
-    drawn_values : list
-        List of values drawn from the probability distribution function.
+    drawn_values : NumPy array
+        Array of values drawn from the probability distribution function.
 
     """
-
     dist_instance = pdf(parameters)
-    drawn_values = dist_instance.rvs(size=size)
+    drawn_values = dist_instance.rvs(
+        size=size, random_state=np.random.default_rng(random_seed)
+    )
+    return drawn_values
+
+
+def draw_from_ppf(pdf, pdf_parameters, cells, random_seed):
+    """
+    Draw from the continuous distributions of a property for people in
+    different condition cells with inverse transform sampling, using one
+    random number per person.
+
+    Parameters
+    ----------
+    pdf : function
+        Function that returns an ``rv_continuous`` object.
+    pdf_parameters : list
+        Parameters of the probability distribution function per condition
+        index.
+    cells : NumPy array
+        Condition index per person, -1 for people without a condition cell,
+        for which NaN is returned.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    probs = rng.random(cells.shape[0])
+    drawn_values = np.full(cells.shape[0], np.nan)
+    for cond_index, positions in split_condition_cells(cells):
+        drawn_values[positions] = pdf(pdf_parameters[cond_index]).ppf(
+            probs[positions]
+        )
     return drawn_values
 
 
-# def cumulative_properties(probab_objects):
-#     properties = [None] * len(probab_objects)
-#     for idx, obj in enumerate(probab_objects):
-#         if idx == 0:
-#             properties[idx] = [obj.property_name]
-#         else:
-#             properties[idx] = properties[idx - 1] + [obj.property_name]
-#     return properties
+def build_family_table(frozen_rvs):
+    """
+    Collects the parameters of frozen scipy.stats distributions per condition
+    index, if they all belong to one of the families in ``NUMPY_FAMILIES``.
+
+    Parameters
+    ----------
+    frozen_rvs : list of frozen rv_continuous objects
+        Distribution per condition index.
+
+    Returns
+    -------
+    family_table : FamilyTable or None
+        Family name, shape parameters with a row per shape parameter and a
+        column per condition index, and location and scale per condition
+        index. None if the distributions cannot be drawn with NumPy.
+    """
+    from scipy import stats
+
+    name = frozen_rvs[0].dist.name
+    if name not in NUMPY_FAMILIES:
+        return None
+    family_type = type(getattr(stats, name))
+    if not all(type(rv.dist) is family_type for rv in frozen_rvs):
+        return None
+
+    shapes, loc, scale = [], [], []
+    for rv in frozen_rvs:
+        rv_shapes, rv_loc, rv_scale = rv.dist._parse_args(*rv.args, **rv.kwds)
+        shapes.append(rv_shapes)
+        loc.append(rv_loc)
+        scale.append(rv_scale)
+    return FamilyTable(
+        name=name,
+        shapes=np.array(shapes, dtype=np.float64).reshape(
+            len(frozen_rvs), -1
+        ).T,
+        loc=np.array(loc, dtype=np.float64),
+        scale=np.array(scale, dtype=np.float64),
+    )
+
+
+def draw_from_family_table(family_table, cells, random_seed):
+    """
+    Draw from the distributions of a property for people in different
+    condition cells with a single call to the NumPy generator.
+
+    Parameters
+    ----------
+    family_table : FamilyTable
+        Parameters per condition index, see ``build_family_table``.
+    cells : NumPy array
+        Condition index per person.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    standard = NUMPY_FAMILIES[family_table.name](
+        rng, family_table.shapes[:, cells], cells.shape[0]
+    )
+    drawn_values = family_table.loc[cells] + family_table.scale[cells] * \
+        standard
+    return drawn_values
+
+
+def build_quantile_table(frozen_rvs, grid_size):
+    """
+    Tabulates the quantile functions of continuous distributions, for
+    inverse transform sampling with ``draw_from_quantile_table``.
+
+    Parameters
+    ----------
+    frozen_rvs : list of frozen rv_continuous objects
+        Distribution per condition index.
+    grid_size : int
+        Number of quantiles per distribution, at the probabilities
+        ``(i + 0.5) / grid_size``.
+
+    Returns
+    -------
+    quantile_table : NumPy array
+        Quantiles with a row per condition index.
+    """
+    probs = (np.arange(grid_size) + 0.5) / grid_size
+    return np.array([rv.ppf(probs) for rv in frozen_rvs], dtype=np.float64)
+
+
+def draw_from_quantile_table(quantile_table, cells, random_seed):
+    """
+    Draw from tabulated distributions for people in different condition
+    cells, by linear interpolation of the quantile function at uniform
+    random probabilities. Values beyond the first and last quantile of the
+    table are not drawn.
+
+    Parameters
+    ----------
+    quantile_table : NumPy array
+        Quantiles per condition index, see ``build_quantile_table``.
+    cells : NumPy array
+        Condition index per person.
+    random_seed : int or numpy.random.Generator
+        Seed or generator for random number generation.
+
+    Returns
+    -------
+    drawn_values : NumPy array
+        Array of drawn values.
+
+    """
+    rng = np.random.default_rng(random_seed)
+    grid_size = quantile_table.shape[1]
+    # Position of the drawn probability on the grid of quantiles.
+    grid_pos = rng.random(cells.shape[0]) * grid_size - 0.5
+    lower = np.clip(np.floor(grid_pos).astype(np.int64), 0, grid_size - 2)
+    weight = np.clip(grid_pos - lower, 0.0, 1.0)
+    drawn_values = (
+        quantile_table[cells, lower] * (1.0 - weight)
+        + quantile_table[cells, lower + 1] * weight
+    )
+    return drawn_values
+
+
+def get_dependency_graph(probab_objects):
+    """
+    Builds the dependency graph of the properties from their conditions.
+
+    Parameters
+    ----------
+    probab_objects : list of ProbabilityClass objects
+
+    Returns
+    -------
+    graph : dict
+        Maps every property name to the names of the properties its
+        conditions reference.
+    """
+    return {obj.property_name: obj.dependencies for obj in probab_objects}
+
+
+def find_cycle(graph):
+    """
+    Finds a cycle in a dependency graph with a depth-first search.
+
+    Parameters
+    ----------
+    graph : dict
+        Dependency graph, see ``get_dependency_graph``. References to
+        properties that are not in the graph are ignored.
+
+    Returns
+    -------
+    cycle : list or None
+        Names of the properties in the cycle, starting and ending with the
+        same property, e.g. ``['a', 'b', 'a']``. None if there is no cycle.
+    """
+    # Properties that are not visited yet, on the current path or done.
+    state = dict.fromkeys(graph, "new")
+    for root in graph:
+        if state[root] != "new":
+            continue
+        state[root] = "path"
+        path = [root]
+        stack = [iter(graph[root])]
+        while stack:
+            dep = next(stack[-1], None)
+            if dep is None:
+                state[path.pop()] = "done"
+                stack.pop()
+            elif state.get(dep) == "path":
+                return path[path.index(dep):] + [dep]
+            elif state.get(dep) == "new":
+                state[dep] = "path"
+                path.append(dep)
+                stack.append(iter(graph[dep]))
+    return None
+
+
+def get_dependency_levels(probab_objects):
+    """
+    Sorts ProbabilityClass objects topologically into levels with Kahn's
+    algorithm. The properties in a level only depend on properties in
+    earlier levels, so they can be drawn in any order or at the same time.
+
+    Parameters
+    ----------
+    probab_objects : list of ProbabilityClass objects
+        Objects to be sorted. Dependencies on properties that are not in
+        the list are assumed to be drawn already.
+
+    Returns
+    -------
+    levels : list of lists of ProbabilityClass objects
+        Levels of objects, each in the order of ``probab_objects``.
+    """
+    position = {obj.property_name: i for i, obj in enumerate(probab_objects)}
+    in_degree = {}
+    dependents = {obj.property_name: [] for obj in probab_objects}
+    for obj in probab_objects:
+        deps = [dep for dep in obj.dependencies if dep in position]
+        in_degree[obj.property_name] = len(deps)
+        for dep in deps:
+            dependents[dep].append(obj)
+
+    levels = []
+    level = [obj for obj in probab_objects
+             if in_degree[obj.property_name] == 0]
+    while level:
+        levels.append(level)
+        next_level = []
+        for obj in level:
+            for dependent in dependents[obj.property_name]:
+                in_degree[dependent.property_name] -= 1
+                if in_degree[dependent.property_name] == 0:
+                    next_level.append(dependent)
+        level = sorted(next_level, key=lambda x: position[x.property_name])
+
+    if sum(len(level) for level in levels) < len(probab_objects):
+        cycle = find_cycle(get_dependency_graph(probab_objects))
+        raise AssertionError(
+            "Circular dependency between properties: " + " -> ".join(cycle)
+        )
+    return levels
 
 
 def order_probab_objects(probab_objects):
     """
-    Orders ProbabilityClass objects so all properties that do not depend on
-    others are handled first.
+    Orders ProbabilityClass objects topologically, so every property comes
+    after the properties its conditions depend on.
 
     Parameters
     ----------
@@ -359,7 +1065,7 @@ def order_probab_objects(probab_objects):
     Returns
     -------
     probab_objects : list of ProbabilityClass objects
-        Ordered list of objects.
+        Ordered list of objects, see ``get_dependency_levels``.
     """
     # There should be at least one property without conditions.
     cond_bool = [
@@ -369,23 +1075,15 @@ def order_probab_objects(probab_objects):
         cond_bool
     ), "There should be at least one property without conditions"
 
-    # Start ordering the list of probab_objects with all the properties with
-    # obj.conditions is None.
-    probab_none = [probab_objects[i] for i, x in enumerate(cond_bool) if x]
-    # probab_none_prop = [obj.property_name for obj in probab_none]
-
-    probab_cond = [probab_objects[i] for i, x in enumerate(cond_bool) if not x]
-    # probab_cond_prop = [obj.property_name for obj in probab_cond]
-
-    probab_objects = probab_none + probab_cond
-
-    return probab_objects
+    return [obj for level in get_dependency_levels(probab_objects)
+            for obj in level]
 
 
 def check_comb_conditions(probab_objects):
     """
     Checks the ProbabilityClass objects for impossible situations, e.g.
-    properties that are dependent on non-defined properties.
+    properties that are dependent on non-defined properties or circular
+    dependencies.
 
     Parameters
     ----------
@@ -398,10 +1096,13 @@ def check_comb_conditions(probab_objects):
 
     for obj in probab_objects:
         if obj.conditions is not None:
-            assert obj.conditions.property_name.values.all() in properties, (
+            undefined = [dep for dep in obj.dependencies
+                         if dep not in properties]
+            assert not undefined, (
                 obj.property_name
                 + ", conditions references undefined "
-                + "properties"
+                + "properties: "
+                + ", ".join(undefined)
             )
             if obj.data_type == "continuous":
                 assert len(
@@ -420,35 +1121,7 @@ def check_comb_conditions(probab_objects):
         "At least one of the properties should be without conditions."
     )
 
-    # # Start ordering the list of probab_objects with all the properties with
-    # # obj.conditions is None.
-    # probab_none = [probab_objects[i] for i, x in enumerate(cond_bool) if x]
-    # probab_none_prop = [obj.property_name for obj in probab_none]
-
-    # probab_cond = [probab_objects[i] for i, x in
-    #                enumerate(cond_bool) if not x]
-    # probab_cond_prop = [obj.property_name for obj in probab_cond]
-
-    #  # Create a graph of the dependencies.
-    #  # Check if there are cycles in the graph. Assert that there are no
-    #  # cycles.
-    #  probab_graph = dict()
-    #  for obj in probab_cond:
-    #      probab_graph[obj.property_name] = \
-    #              np.unique(obj.conditions.property_name).tolist()
-
-    #  for key in probab_graph.keys():
-    #      # If all the values of probab_graph are have no conditions,
-    #      # the graph cannot be simplified further.
-    #      probab_graph_values = probab_graph[key]
-    #      while not all(item in probab_none_prop for item in
-    #                    probab_graph_values):
-    #          assert key not in probab_graph_values, \
-    #              'Circular dependency, ' + key
-
-    #          probab_graph_values = [probab_graph[k] for k in
-    #                                 probab_graph_values if k not in
-    #                                 probab_none_prop]
-    #          probab_graph_values = [item for sublist in probab_graph_values
-    #                  for item in sublist]
-    return
+    cycle = find_cycle(get_dependency_graph(probab_objects))
+    assert cycle is None, (
+        "Circular dependency between properties: " + " -> ".join(cycle)
+    )
@@ -0,0 +1,191 @@
+"""
+Write synthetic settings files for testing Simago with large numbers of
+properties and condition cells, e.g.
+
+``python -m simago.synthetic ./synthetic/ --properties 200 --options 5
+    --fan_out 2 --depth 4``
+
+The settings can then be used with
+``python -m simago -p 1000 --yaml_folder ./synthetic/``. The folder should
+be inside the working directory, as the pdf file is imported relative to it.
+"""
+import argparse
+import itertools
+import os
+
+import numpy as np
+
+
+# The pdf functions of the continuous properties, with the parameter order
+# of the example.
+PDF_SOURCE = '''"""
+Probability distribution functions of the synthetic continuous properties.
+"""
+from scipy.stats import lognorm, norm
+
+
+def pdf_norm(params):
+    """Normal distribution with loc and scale."""
+    return norm(loc=params[0], scale=params[1])
+
+
+def pdf_lognorm(params):
+    """Lognormal distribution with scale and shape s = sigma."""
+    return lognorm(s=params[1], scale=params[0])
+'''
+
+
+def write_synthetic_settings(folder, num_properties=50, num_options=5,
+                             fan_out=2, depth=3, continuous_fraction=0.2,
+                             random_seed=0):
+    """Write synthetic settings files.
+
+    Writes settings files, data files, conditions files and a pdf file for
+    properties with random probabilities, arranged in levels of a
+    dependency graph. The properties in the first level have no conditions.
+    Every other discrete property has a condition cell for every combination
+    of the options of its parents. One of the parents is in the level
+    directly above the property, so the graph has ``depth`` levels below
+    the first one. Continuous properties are not used as parents.
+
+    Parameters
+    ----------
+    folder : str
+        Folder in which the files are written. Created if it does not exist.
+    num_properties : int
+        Number of properties.
+    num_options : int
+        Number of options per discrete property.
+    fan_out : int
+        Number of parents of every conditioned property. The properties
+        have ``num_options ** fan_out`` condition cells.
+    depth : int
+        Number of levels of conditioned properties.
+    continuous_fraction : float
+        Fraction of the conditioned properties that is continuous.
+    random_seed : int
+        Seed for the probabilities, parents and distributions.
+
+    Returns
+    -------
+    yaml_filenames : list of str
+        List of the written settings files.
+    """
+    assert num_properties > depth, \
+        "There should be more properties than levels of conditions"
+    assert num_options >= 1, "Number of options must be 1 or greater."
+    assert fan_out >= 1, "Fan out must be 1 or greater."
+    rng = np.random.default_rng(random_seed)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "pdf.py"), "w") as pdf_file:
+        pdf_file.write(PDF_SOURCE)
+
+    # Level in the dependency graph per property; level 0 has no conditions.
+    levels = (np.arange(num_properties) * (depth + 1)
+              // num_properties).tolist()
+    names = ["property_%d" % (i) for i in range(num_properties)]
+    discrete = {0: []}
+    yaml_filenames = []
+    for i, (name, level) in enumerate(zip(names, levels)):
+        yaml_lines = ['property_name: "%s"' % (name)]
+        # The first property of every level is discrete, so the next level
+        # has a parent directly above.
+        is_continuous = (level > 0) and (len(discrete.get(level, [])) > 0) \
+            and (rng.random() < continuous_fraction)
+
+        if level == 0:
+            parents = []
+        else:
+            # One parent directly above, the others anywhere above.
+            above = [j for lvl in range(level - 1) for j in discrete[lvl]]
+            direct = discrete[level - 1]
+            first = direct[rng.integers(len(direct))]
+            others = [j for j in above + direct if j != first]
+            num_others = min(fan_out - 1, len(others))
+            parents = [first] + sorted(
+                rng.choice(others, num_others, replace=False).tolist()
+            )
+        cells = list(itertools.product(range(num_options),
+                                       repeat=len(parents)))
+
+        if is_continuous:
+            yaml_lines += [
+                'data_type: "continuous"',
+                'pdf_file: "pdf.py"',
+            ]
+            if rng.random() < 0.5:
+                parameters = [[float(rng.uniform(-10, 10)),
+                               float(rng.uniform(0.5, 2))] for _ in cells]
+                yaml_lines.append('pdf: "pdf_norm"')
+            else:
+                parameters = [[float(rng.uniform(100, 10000)),
+                               float(rng.uniform(0.2, 1))] for _ in cells]
+                yaml_lines.append('pdf: "pdf_lognorm"')
+            yaml_lines.append("pdf_parameters: %s" % (parameters))
+        else:
+            yaml_lines += [
+                'data_type: "categorical"',
+                'data_file: "%s.csv"' % (name),
+            ]
+            data_lines = ["option,value,label,condition_index"]
+            for cond_index in range(len(cells)):
+                values = rng.integers(1, 1000, num_options)
+                data_lines += [
+                    "%d,%d,%s_%d,%d" % (option, values[option], name,
+                                        option, cond_index)
+                    for option in range(num_options)
+                ]
+            _write_lines(os.path.join(folder, name + ".csv"), data_lines)
+            discrete.setdefault(level, []).append(i)
+
+        if parents:
+            yaml_lines.append('conditions: "%s_conditions.csv"' % (name))
+            conditions_lines = ["condition_index,property_name,option,"
+                                + "relation"]
+            for cond_index, cell in enumerate(cells):
+                conditions_lines += [
+                    "%d,%s,%d,eq" % (cond_index, names[parent], option)
+                    for parent, option in zip(parents, cell)
+                ]
+            _write_lines(os.path.join(folder, name + "_conditions.csv"),
+                         conditions_lines)
+        else:
+            yaml_lines.append("conditions: null")
+
+        yaml_filename = os.path.join(folder, "%04d_%s.yml" % (i, name))
+        _write_lines(yaml_filename, yaml_lines)
+        yaml_filenames.append(yaml_filename)
+
+    return yaml_filenames
+
+
+def _write_lines(filename, lines):
+    """Writes lines to a text file."""
+    with open(filename, "w") as text_file:
+        text_file.write("\n".join(lines) + "\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("folder", type=str,
+                        help="Folder for the settings files")
+    parser.add_argument("--properties", type=int, default=50,
+                        help="Number of properties")
+    parser.add_argument("--options", type=int, default=5,
+                        help="Number of options per discrete property")
+    parser.add_argument("--fan_out", type=int, default=2,
+                        help="Number of parents per conditioned property")
+    parser.add_argument("--depth", type=int, default=3,
+                        help="Number of levels of conditioned properties")
+    parser.add_argument("--continuous", type=float, default=0.2,
+                        help="Fraction of continuous conditioned properties")
+    parser.add_argument("--rand_seed", type=int, default=0,
+                        help="Seed for random number generation")
+    args = parser.parse_args()
+
+    yaml_filenames = write_synthetic_settings(
+        args.folder, args.properties, args.options, args.fan_out, args.depth,
+        args.continuous, args.rand_seed,
+    )
+    print("Written %d settings files to %s" % (len(yaml_filenames),
+                                               args.folder))
@@ -0,0 +1,248 @@
+"""
+Classes for writing the population to file, at once or in chunks.
+"""
+import json
+import os
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+# Number of people written to file at a time.
+WRITE_ROWS = 2 ** 18
+
+# Filename of the manifest of a population written by the NpyWriter.
+MANIFEST = "manifest.json"
+
+
+class PopulationWriter(ABC):
+    """
+    Abstract base class; inherited versions of this class write a population
+    to a file in a certain format. The population can be written at once or
+    as consecutive chunks, see ``PopulationClass.stream``.
+
+    Parameters
+    ----------
+    output : string
+        Path and filename of the output.
+    pop_obj : PopulationClass
+        Population to be written; for chunked writing the population the
+        chunks are taken from.
+
+    Attributes
+    ----------
+    output : string
+        Path and filename of the output.
+
+    """
+    def __init__(self, output, pop_obj):
+        self.output = output
+
+    @abstractmethod
+    def write(self, pop_obj):
+        """
+        Writes a population, or the next chunk of the population.
+
+        Parameters
+        ----------
+        pop_obj : PopulationClass
+        """
+
+    def close(self):
+        """Finishes writing the file."""
+
+
+class CSVWriter(PopulationWriter):
+    """
+    Writes the population to a CSV file, with the labels of the discrete
+    properties.
+    """
+    def __init__(self, output, pop_obj):
+        super(CSVWriter, self).__init__(output, pop_obj)
+        self._header_written = False
+
+    def write(self, pop_obj):
+        """
+        Writes a population, or the next chunk of the population, a range of
+        people at a time, so the labelled population is never built as a
+        whole.
+
+        Parameters
+        ----------
+        pop_obj : PopulationClass
+        """
+        for start in range(0, pop_obj.popsize, WRITE_ROWS):
+            pop_obj.get_labelled_population(
+                start, min(start + WRITE_ROWS, pop_obj.popsize)
+            ).to_csv(
+                path_or_buf=self.output,
+                mode="a" if self._header_written else "w",
+                header=not self._header_written,
+                index=False,
+            )
+            self._header_written = True
+
+
+class ParquetWriter(PopulationWriter):
+    """
+    Writes the population to a Parquet file with ``pyarrow``. Discrete
+    properties are written as dictionary-encoded columns with the labels
+    as dictionary, continuous properties as floats. Missing data is written
+    as null. Every range of people is written as a separate row group, so
+    single columns and row groups can be read without reading the whole
+    file.
+    """
+    def __init__(self, output, pop_obj):
+        super(ParquetWriter, self).__init__(output, pop_obj)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                "Writing Parquet files requires pyarrow, which can be "
+                + "installed with 'pip install simago[parquet]'."
+            )
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._writer = None
+        # Dictionaries of the discrete properties.
+        self._dictionaries = {}
+
+    def _to_table(self, pop_obj, start, stop):
+        """Converts a range of the population to an Arrow table."""
+        pa = self._pa
+        arrays = {"person_id": pa.array(pop_obj.person_id[start:stop])}
+        for prop, values in pop_obj.columns.items():
+            values = values[start:stop]
+            if prop in pop_obj.labels:
+                # The last label is the 'nodata' label of missing data.
+                nodata = len(pop_obj.labels[prop]) - 1
+                if prop not in self._dictionaries:
+                    self._dictionaries[prop] = pa.array(
+                        list(pop_obj.labels[prop][:nodata])
+                    )
+                dictionary = self._dictionaries[prop]
+                index_type = np.min_scalar_type(-nodata)
+                indices = pa.array(values.astype(index_type),
+                                   mask=(values == nodata))
+                arrays[prop] = pa.DictionaryArray.from_arrays(
+                    indices, dictionary
+                )
+            else:
+                arrays[prop] = pa.array(values, mask=np.isnan(values))
+        return pa.table(arrays)
+
+    def write(self, pop_obj):
+        """
+        Writes a population, or the next chunk of the population, as row
+        groups of at most ``WRITE_ROWS`` people.
+
+        Parameters
+        ----------
+        pop_obj : PopulationClass
+        """
+        for start in range(0, pop_obj.popsize, WRITE_ROWS):
+            table = self._to_table(
+                pop_obj, start, min(start + WRITE_ROWS, pop_obj.popsize)
+            )
+            if self._writer is None:
+                self._writer = self._pq.ParquetWriter(
+                    self.output, table.schema
+                )
+            self._writer.write_table(table)
+
+    def close(self):
+        """Writes the footer of the Parquet file."""
+        if self._writer is not None:
+            self._writer.close()
+
+
+class NpyWriter(PopulationWriter):
+    """
+    Writes the population to a directory with a ``.npy`` file per property
+    and a JSON manifest with the population size, random seed and the
+    dtype, labels and code for missing data of every property. The files
+    can be memory-mapped with ``simago.population.load_population``.
+
+    The ``.npy`` files are created at their full size when a property is
+    first written, after which every chunk is written at its position.
+    """
+    def __init__(self, output, pop_obj):
+        super(NpyWriter, self).__init__(output, pop_obj)
+        os.makedirs(output, exist_ok=True)
+        self.popsize = pop_obj.popsize
+        self.first_person_id = pop_obj.first_person_id
+        self._arrays = {}
+        self._last_written = None
+
+    def write(self, pop_obj):
+        """
+        Writes a population, or the next chunk of the population.
+
+        Parameters
+        ----------
+        pop_obj : PopulationClass
+        """
+        start = pop_obj.first_person_id - self.first_person_id
+        for prop, values in pop_obj.columns.items():
+            if prop not in self._arrays:
+                self._arrays[prop] = np.lib.format.open_memmap(
+                    os.path.join(self.output, prop + ".npy"),
+                    mode="w+",
+                    dtype=values.dtype,
+                    shape=(self.popsize,),
+                )
+            self._arrays[prop][start:start + pop_obj.popsize] = values
+        self._last_written = pop_obj
+
+    def close(self):
+        """Flushes the ``.npy`` files and writes the manifest."""
+        for array in self._arrays.values():
+            array.flush()
+        pop_obj = self._last_written
+        if pop_obj is None:
+            return
+        properties = []
+        for prop, array in self._arrays.items():
+            if prop in pop_obj.labels:
+                labels = pop_obj.labels[prop][:-1]
+                properties.append({
+                    "property_name": prop,
+                    "dtype": array.dtype.str,
+                    "labels": [_to_json(label) for label in labels],
+                    "nodata": len(labels),
+                })
+            else:
+                properties.append({
+                    "property_name": prop,
+                    "dtype": array.dtype.str,
+                    "labels": None,
+                    "nodata": None,
+                })
+        manifest = {
+            "popsize": self.popsize,
+            "first_person_id": self.first_person_id,
+            "block_size": pop_obj.block_size,
+            "random_seed": pop_obj.random_seed,
+            "entropy": pop_obj.seed_sequence.entropy,
+            "counter_based": pop_obj.counter_based,
+            "draw_counts": pop_obj._draw_counts,
+            "partial_draws": sorted(pop_obj._partial_draws),
+            "properties": properties,
+        }
+        with open(os.path.join(self.output, MANIFEST), "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+
+
+def _to_json(label):
+    """Converts a label to a type that can be written to JSON."""
+    return label.item() if isinstance(label, np.generic) else label
+
+
+# Writers per file format, see PopulationClass.export.
+WRITERS = {
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+    "npy": NpyWriter,
+}
@@ -4,6 +4,7 @@ Functions for finding, checking and loading of the YAML configuration files.
 import ast
 import os
 
+import numpy as np
 import yaml
 
 
@@ -82,6 +83,11 @@ def check_yaml(yaml_object):
             fname + ', data file does not exist'
         assert yaml_object['data_file'].endswith('.csv'),\
             fname + ', data file is not a CSV file'
+
+        if 'sampling' not in yaml_object.keys():
+            yaml_object['sampling'] = 'direct'
+        assert yaml_object['sampling'] in ['direct', 'quota'],\
+            fname + ', invalid sampling method'
     elif yaml_object['data_type'] == "continuous":
         assert 'pdf_parameters' in yaml_object.keys(),\
             fname + ', no parameters defined'
@@ -109,6 +115,32 @@ def check_yaml(yaml_object):
             print(fname + ', pdf file can not be executed')
             quit()
 
+        if 'sampling' not in yaml_object.keys():
+            yaml_object['sampling'] = 'direct'
+        assert yaml_object['sampling'] in ['direct', 'quantile_table'],\
+            fname + ', invalid sampling method'
+        if 'quantile_grid' not in yaml_object.keys():
+            yaml_object['quantile_grid'] = 1024
+        assert isinstance(yaml_object['quantile_grid'], int) \
+            and yaml_object['quantile_grid'] >= 2,\
+            fname + ', quantile grid is not an integer of 2 or greater'
+
+    if 'dtype' not in yaml_object.keys():
+        yaml_object['dtype'] = None
+    else:
+        assert isinstance(yaml_object['dtype'], str), \
+            fname + ', dtype is not a string'
+        try:
+            dtype = np.dtype(yaml_object['dtype'])
+        except TypeError:
+            raise AssertionError(fname + ', invalid dtype')
+        if yaml_object['data_type'] in ['categorical', 'ordinal']:
+            assert dtype.kind in ['u', 'i'], \
+                fname + ', dtype of discrete data is not an integer type'
+        else:
+            assert dtype.kind == 'f', \
+                fname + ', dtype of continuous data is not a float type'
+
     if 'conditions' not in yaml_object.keys():
         yaml_object['conditions'] = None
     else:
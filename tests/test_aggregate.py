@@ -0,0 +1,139 @@
+"""
+Tests for the file simago/aggregate.py.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from simago.aggregate import AggregateClass, generate_aggregate
+from simago.metrics import Metrics
+from simago.probability import DiscreteProbabilityClass, allocate_quota
+from simago.yamlutils import load_yamls
+
+
+def test_AggregateClass_update():
+    """
+    The counts of a large population follow the probabilities, and the
+    materialized people have the same options and condition cells.
+    """
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    aggregate = generate_aggregate(10 ** 8, yaml_folder, 100)
+    aggregate.update()
+    assert aggregate.counts.sum() == 10 ** 8
+    # One group per combination of sex and age.
+    assert aggregate.counts.shape[0] == 200
+
+    sex_counts = aggregate.get_counts(["sex"])
+    assert sex_counts["sex"].tolist() == ["female", "male"]
+    males = sex_counts["count"].values[1] / 10 ** 8
+    assert abs(males - 3805370719 / (3805370719 + 3742018211)) < 1e-3
+    # Everyone has a sex, so everyone gets an age.
+    ages = aggregate.get_counts(["age"])
+    assert "nodata" not in ages["age"].tolist()
+    assert set(aggregate.get_counts()) == {
+        "sex", "age", "income_cond_index", "count"
+    }
+
+    # The same seed gives the same counts.
+    other = generate_aggregate(10 ** 8, yaml_folder, 100)
+    other.update()
+    assert np.array_equal(aggregate.counts, other.counts)
+
+    aggregate = generate_aggregate(1000, yaml_folder, 100)
+    aggregate.update()
+    population = aggregate.to_population()
+    assert population.popsize == 1000
+    for prop in ["sex", "age"]:
+        counts = aggregate.get_counts([prop])
+        labelled = population.get_labelled_population()[prop]
+        assert labelled.value_counts().sort_index().tolist() == \
+            counts["count"].tolist()
+    income_cells = np.bincount(population.get_condition_cells("income") + 1)
+    assert income_cells.tolist() == \
+        aggregate.get_counts(["income"])["count"].tolist()
+    assert np.isnan(population.columns["income"]).sum() == income_cells[0]
+
+    # Without properties all people are in a single group.
+    aggregate = generate_aggregate(10, "./tests/testdata/AggregateClass/")
+    aggregate.prob_objects = {}
+    aggregate.update()
+    assert aggregate.get_counts()["count"].tolist() == [10]
+
+
+def test_AggregateClass_add_property():
+    """
+    Only new ProbabilityClass objects are added.
+    """
+    aggregate = generate_aggregate(
+        10, "./tests/testdata/PopulationClass/", 100
+    )
+    prob_objects = dict(aggregate.prob_objects)
+    aggregate.add_property("new_variable")
+    aggregate.add_property(prob_objects["sex"])
+    assert aggregate.prob_objects == prob_objects
+
+
+def test_AggregateClass_quota():
+    """
+    With quota sampling the counts per condition cell are exact.
+    """
+    yaml_folder = "./tests/testdata/ProbabilityClass/"
+    aggregate = AggregateClass(1001, 100)
+    for y_obj in load_yamls([yaml_folder + "sex_quota.yml",
+                             yaml_folder + "age_quota.yml"]):
+        aggregate.add_property(DiscreteProbabilityClass(y_obj))
+    aggregate.update()
+
+    sex = aggregate.columns["sex"]
+    sex_counts = np.bincount(sex, weights=aggregate.counts)
+    assert sex_counts[0] == 505
+    cdf_table = aggregate.prob_objects["age"].cdf_table
+    expected = allocate_quota(cdf_table, sex_counts.astype(np.int64))
+    for option in [0, 1]:
+        offsets = cdf_table.offsets[option:option + 2]
+        age_counts = np.bincount(
+            aggregate.columns["age"][sex == option],
+            weights=aggregate.counts[sex == option],
+            minlength=offsets[1] - offsets[0],
+        )
+        assert np.array_equal(age_counts, expected[offsets[0]:offsets[1]])
+
+
+def test_AggregateClass_continuous_condition():
+    """
+    Aggregates can not be conditioned on continuous properties.
+    """
+    aggregate = generate_aggregate(
+        100, "./tests/testdata/AggregateClass/", 100
+    )
+    with pytest.raises(AssertionError):
+        aggregate.update()
+
+
+def test_AggregateClass_export(tmp_path, capsys):
+    """
+    The counts are written to a CSV file, or only printed with nowrite.
+    """
+    metrics = Metrics()
+    aggregate = generate_aggregate(
+        1000, "./tests/testdata/PopulationClass/", 100, metrics=metrics
+    )
+    aggregate.update()
+    output = str(tmp_path / "counts.csv")
+    aggregate.export(output)
+    counts = pd.read_csv(output)
+    assert counts.columns.tolist() == [
+        "sex", "age", "income_cond_index", "count"
+    ]
+    assert counts["count"].sum() == 1000
+    assert counts["count"].tolist() == \
+        aggregate.get_counts()["count"].tolist()
+    record = metrics.records[("export", None, None)]
+    assert record["bytes"] == (tmp_path / "counts.csv").stat().st_size
+
+    other = str(tmp_path / "other.csv")
+    aggregate.export(other, nowrite=True)
+    assert not (tmp_path / "other.csv").exists()
+    assert "Counts are not written to disk." in capsys.readouterr().out
+    with pytest.raises(AssertionError):
+        aggregate.export(1)
@@ -0,0 +1,61 @@
+"""
+Tests for the file simago/cache.py.
+"""
+import shutil
+
+from pandas.testing import assert_frame_equal
+
+from simago.cache import hash_settings, read_cache
+from simago.population import PopulationClass, load_probab_objects
+from simago.yamlutils import find_yamls
+
+
+def test_hash_settings(tmp_path):
+    """
+    The hash of the settings changes when any of the files the settings
+    refer to changes.
+    """
+    yaml_folder = str(tmp_path / "settings") + "/"
+    shutil.copytree("./tests/testdata/PopulationClass/", yaml_folder)
+    yaml_filenames = find_yamls(yaml_folder)
+    key = hash_settings(yaml_filenames)
+    assert hash_settings(yaml_filenames) == key
+
+    for filename in ["age.csv", "income_conditions.csv", "pdf.py",
+                     "1_sex.yml"]:
+        with open(yaml_folder + filename, "a") as changed_file:
+            changed_file.write("\n")
+        new_key = hash_settings(yaml_filenames)
+        assert new_key != key
+        key = new_key
+
+
+def test_load_probab_objects_cache(tmp_path, capsys):
+    """
+    The ProbabilityClass objects are read from the cache when it was written
+    for the same settings, without importing the pdf files, and draw the
+    same population.
+    """
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    cache_file = str(tmp_path / "model.pkl")
+    probab_objects = load_probab_objects(yaml_folder, cache_file)
+    assert "from cache" not in capsys.readouterr().out
+
+    cached = load_probab_objects(yaml_folder, cache_file)
+    assert "loaded from cache" in capsys.readouterr().out
+    assert [obj.property_name for obj in cached] == ["sex", "age", "income"]
+    assert cached[2]._pdf is None
+    assert cached[2].pdf(cached[2].pdf_parameters[0]).dist.name == "lognorm"
+
+    populations = []
+    for objects in [probab_objects, cached]:
+        pop_class = PopulationClass(100, 100, block_size=8)
+        for obj in objects:
+            pop_class.add_property(obj)
+        pop_class.update()
+        populations.append(pop_class.population)
+    assert_frame_equal(populations[0], populations[1])
+
+    # A cache written for other settings is not used.
+    assert read_cache(cache_file, "stale") is None
+    assert read_cache(str(tmp_path / "missing.pkl"), "stale") is None
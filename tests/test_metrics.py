@@ -0,0 +1,67 @@
+"""
+Tests for the file simago/metrics.py.
+"""
+import json
+import os
+
+from simago.metrics import Metrics
+from simago.population import generate_population
+
+
+def test_Metrics_record():
+    """
+    Records with the same stage, property and condition index are summed
+    and passed to the callback.
+    """
+    calls = []
+    metrics = Metrics(callback=lambda *args: calls.append(args))
+    metrics.record("draw", 0.5, "sex", people=10, nbytes=10)
+    metrics.record("draw", 0.25, "sex", people=5, nbytes=5)
+    metrics.record("condition_cell", 0.1, "age", 1, people=3, nbytes=10)
+    assert metrics.records[("draw", "sex", None)] == {
+        "calls": 2, "seconds": 0.75, "people": 15, "bytes": 15
+    }
+    assert len(calls) == 3
+    assert calls[2] == ("condition_cell", "age", 1, 0.1, 3, 10)
+    assert metrics.to_list()[1] == {
+        "stage": "condition_cell", "property_name": "age", "cond_index": 1,
+        "calls": 1, "seconds": 0.1, "people": 3, "bytes": 10,
+    }
+
+
+def test_Metrics_population(tmp_path):
+    """
+    The stages of generating, drawing and exporting a population are
+    recorded and exported as JSON.
+    """
+    popsize = 100
+    metrics = Metrics()
+    pop_class = generate_population(
+        popsize, "./tests/testdata/PopulationClass/", 100, metrics=metrics
+    )
+    pop_class.update()
+    output = str(tmp_path / "population.csv")
+    pop_class.export(output)
+
+    records = metrics.records
+    for stage in ["load", "compile"]:
+        assert records[(stage, None, None)]["calls"] == 1
+    for prop, nbytes in [("sex", 1), ("age", 1), ("income", 8)]:
+        assert records[("draw", prop, None)]["people"] == popsize
+        assert records[("draw", prop, None)]["bytes"] == nbytes * popsize
+    # Everyone is either male or female.
+    assert records[("condition_cell", "age", 0)]["people"] \
+        + records[("condition_cell", "age", 1)]["people"] == popsize
+    assert records[("export", None, None)]["bytes"] == \
+        os.path.getsize(output)
+
+    metrics_json = str(tmp_path / "metrics.json")
+    metrics.to_json(metrics_json)
+    with open(metrics_json) as json_file:
+        assert json.load(json_file)["records"] == metrics.to_list()
+
+    # Chunks drawn in the current process record per property as well; the
+    # population fits in a single chunk.
+    pop_class.stream(output, 16)
+    assert records[("draw", "sex", None)]["calls"] == 2
+    assert records[("export", None, None)]["calls"] == 2
@@ -11,13 +11,19 @@ from pandas._testing import assert_frame_equal
 
 from simago.population import (
     PopulationClass,
+    _draw_chunk,
+    _init_worker,
     construct_query_string,
     generate_population,
+    load_population,
+    load_probab_objects,
 )
 from simago.probability import (
     ContinuousProbabilityClass,
     DiscreteProbabilityClass,
+    allocate_quota,
 )
+from simago.synthetic import write_synthetic_settings
 from simago.yamlutils import find_yamls, load_yamls
 
 
@@ -198,6 +204,189 @@ def test_PopClass_get_conditional_population():
     assert population_cond.equals(test_population_cond)
 
 
+def test_PopClass_get_condition_cells():
+    """
+    The get_condition_cells() method should assign every person to the
+    condition index of the condition it satisfies.
+    """
+    popsize = 100
+    random_seed = 100
+    pop_class = PopulationClass(popsize, random_seed)
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+    pop_class.update(property_name="all")
+
+    cells = pop_class.get_condition_cells('age')
+    test_cells = pop_class.population["sex"].to_numpy()
+    assert np.array_equal(cells, test_cells)
+
+    # Income has conditions on both sex and age; people outside of the age
+    # ranges do not have a condition cell.
+    cells = pop_class.get_condition_cells('income')
+    population = pop_class.population
+    test_cells = np.full(popsize, -1)
+    test_cells[((population["sex"] == 0) & (population["age"] >= 18)
+                & (population["age"] <= 50)).to_numpy()] = 0
+    test_cells[((population["sex"] == 1) & (population["age"] >= 18)
+                & (population["age"] <= 65)).to_numpy()] = 1
+    assert np.array_equal(cells, test_cells)
+    assert np.isnan(population["income"].to_numpy()[cells == -1]).all()
+    assert not np.isnan(population["income"].to_numpy()[cells != -1]).any()
+
+
+def test_PopClass_condition_cell_lookup(tmp_path, monkeypatch):
+    """
+    Condition cells looked up from the codes of the conditioning properties
+    match the cells found with the condition masks, also for people without
+    data and for a subset of the people.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    write_synthetic_settings("lookup_settings/", num_properties=8,
+                             num_options=4, fan_out=2, depth=2,
+                             continuous_fraction=0.0, random_seed=2)
+    pop_class = PopulationClass(500, 100)
+    for prob_obj in load_probab_objects("./lookup_settings/"):
+        pop_class.add_property(prob_obj)
+    pop_class.update()
+    first = pop_class.prob_objects["property_0"]
+    pop_class.columns["property_0"][:10] = first.nodata
+
+    positions = np.array([0, 5, 17, 250, 499])
+    conditioned = [prob_obj.property_name
+                   for prob_obj in pop_class.prob_objects.values()
+                   if prob_obj.conditions is not None]
+    looked_up = {prop: (pop_class.get_condition_cells(prop),
+                        pop_class.get_condition_cells(prop, positions))
+                 for prop in conditioned}
+    assert len(pop_class._cell_lookups) == len(conditioned)
+
+    monkeypatch.setattr("simago.population.CELL_LOOKUP_SIZE", 0)
+    pop_class._cell_lookups.clear()
+    for prop in conditioned:
+        cells = pop_class.get_condition_cells(prop)
+        assert np.array_equal(looked_up[prop][0], cells)
+        assert np.array_equal(looked_up[prop][1], cells[positions])
+    assert not pop_class._cell_lookups
+
+
+def test_PopClass_condition_mask_cache():
+    """
+    Condition masks are shared between properties and are invalidated when
+    the property they depend on is drawn again.
+    """
+    popsize = 100
+    random_seed = 100
+    pop_class = PopulationClass(popsize, random_seed)
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+    # 'age >= 18' is used by both condition cells of income and is
+    # evaluated once during the update.
+    evaluated = []
+    get_condition_mask = pop_class.get_condition_mask
+
+    def spy(*args, **kwargs):
+        """Records whether the mask is evaluated or taken from the cache."""
+        evaluated.append(args[:3] not in pop_class._mask_cache)
+        return get_condition_mask(*args, **kwargs)
+
+    pop_class.get_condition_mask = spy
+    pop_class.update(property_name="all")
+    del pop_class.get_condition_mask
+    assert evaluated.count(True) == 5
+    assert evaluated.count(False) == 1
+    # The masks are freed once the update is done.
+    assert not pop_class._mask_cache
+
+    mask = pop_class.get_condition_mask("sex", "eq", 0)
+    assert mask is pop_class.get_condition_mask("sex", "eq", 0)
+    assert np.array_equal(mask, (pop_class.population["sex"] == 0).to_numpy())
+    age_mask = pop_class.get_condition_mask("age", "geq", 18)
+    assert ("age", "geq", 18) in pop_class._mask_cache
+
+    # Redrawing sex also redraws age, so the masks of both are evaluated
+    # again for the new values.
+    pop_class.update(property_name="sex")
+    assert not pop_class._mask_cache
+    assert pop_class.get_condition_mask("sex", "eq", 0) is not mask
+    assert pop_class.get_condition_mask("age", "geq", 18) is not age_mask
+
+    # Invalidating the masks on sex keeps those on age.
+    pop_class._invalidate_masks("sex")
+    assert ("sex", "eq", 0) not in pop_class._mask_cache
+    assert ("age", "geq", 18) in pop_class._mask_cache
+    assert np.array_equal(pop_class.get_condition_mask("sex", "neq", 0),
+                          (pop_class.population["sex"] != 0).to_numpy())
+
+    # People without data do not satisfy any relation.
+    pop_class.columns["age"][0] = pop_class.prob_objects["age"].nodata
+    assert not pop_class.get_condition_mask("age", "geq", 0)[0]
+    assert pop_class.get_condition_mask("age", "geq", 0)[1:].all()
+
+
+def test_PopClass_random_streams():
+    """
+    Every property draws from its own random streams: populations with the
+    same seed are equal, a redraw of one property does not change the values
+    of the others and every redraw gives new values.
+    """
+    popsize = 100
+    random_seed = 100
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    probab_objects = []
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            probab_objects.append(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            probab_objects.append(ContinuousProbabilityClass(y_obj))
+
+    pop_classes = [PopulationClass(popsize, random_seed) for _ in range(2)]
+    for pop_class in pop_classes:
+        for probab_object in probab_objects:
+            pop_class.add_property(probab_object)
+    pop_classes[0].update(property_name="all")
+    pop_classes[1].update(property_name="sex")
+    pop_classes[1].update(property_name="age")
+    pop_classes[1].update(property_name="income")
+    assert_frame_equal(pop_classes[0].population, pop_classes[1].population)
+
+    population = pop_classes[0].population.copy()
+    pop_classes[0].update(property_name="income")
+    assert_frame_equal(pop_classes[0].population[["person_id", "sex", "age"]],
+                       population[["person_id", "sex", "age"]])
+    assert not pop_classes[0].population["income"].equals(
+        population["income"])
+
+    # Without a random seed the entropy of the seed sequence is drawn.
+    pop_class = PopulationClass(popsize)
+    assert pop_class.seed_sequence.entropy is not None
+    assert pop_class.get_rng("sex").random() != \
+        PopulationClass(popsize).get_rng("sex").random()
+    assert pop_class.get_rng("sex", 0).random() == \
+        pop_class.get_rng("sex", 0).random()
+    assert pop_class.get_rng("sex", 0).random() != \
+        pop_class.get_rng("sex", 1).random()
+
+    pop_class = PopulationClass(10, random_seed, block_size=4)
+    blocks = [(start, stop) for start, stop, rng in
+              pop_class.iter_blocks("sex")]
+    assert blocks == [(0, 4), (4, 8), (8, 10)]
+
+
 def test_PopClass_update():
     """
     When updating the PopulationClass a new column of each
@@ -241,6 +430,250 @@ def test_PopClass_update():
     assert sorted(pop_class.population.columns.values) == \
         ['age', 'income', 'person_id', 'sex']
 
+    # The population is a view on one array per property.
+    assert sorted(pop_class.columns.keys()) == ['age', 'income', 'sex']
+    for prop, values in pop_class.columns.items():
+        assert values.shape == (popsize, )
+        assert np.shares_memory(pop_class.population[prop].to_numpy(),
+                                values)
+    assert np.array_equal(pop_class.population["person_id"],
+                          np.arange(popsize))
+
+
+def test_PopClass_update_dependents():
+    """
+    Updating a property also redraws the drawn properties that depend on
+    it, directly or indirectly, and no other properties.
+    """
+    popsize = 10
+    random_seed = 100
+    pop_class = PopulationClass(popsize, random_seed)
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+    assert pop_class.get_dependents("sex") == {"age", "income"}
+    assert pop_class.get_dependents("age") == {"income"}
+    assert pop_class.get_dependents(["income"]) == set()
+
+    # Properties that are not drawn yet are not drawn as dependents.
+    pop_class.update("sex")
+    pop_class.update("age")
+    assert pop_class._draw_counts == {"sex": 1, "age": 1}
+    pop_class.update("sex")
+    assert pop_class._draw_counts == {"sex": 2, "age": 2}
+
+    pop_class.update("income")
+    pop_class.update("age")
+    assert pop_class._draw_counts == {"sex": 2, "age": 3, "income": 2}
+    pop_class.update("income")
+    assert pop_class._draw_counts == {"sex": 2, "age": 3, "income": 3}
+    pop_class.update("sex")
+    assert pop_class._draw_counts == {"sex": 3, "age": 4, "income": 4}
+
+
+def test_PopClass_update_people_id():
+    """
+    Updating a subset of the people only redraws the properties of these
+    people, with the conditions evaluated for the subset.
+    """
+    popsize = 100
+    random_seed = 100
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    pop_classes = [PopulationClass(popsize, random_seed, block_size=8)
+                   for _ in range(2)]
+    for pop_class in pop_classes:
+        for y_obj in yaml_objects:
+            if y_obj["data_type"] in ["categorical", "ordinal"]:
+                pop_class.add_property(DiscreteProbabilityClass(y_obj))
+            elif y_obj["data_type"] in ["continuous"]:
+                pop_class.add_property(ContinuousProbabilityClass(y_obj))
+        pop_class.update()
+    pop_class = pop_classes[0]
+
+    people_id = np.array([71, 3, 1, 7, 7, 12])
+    positions = np.array([1, 3, 7, 12, 71])
+    # Condition cells of a subset match those of the whole population,
+    # with and without cached masks.
+    cells = pop_class.get_condition_cells("income")
+    assert np.array_equal(
+        pop_class.get_condition_cells("income", positions), cells[positions]
+    )
+    pop_class._mask_cache.clear()
+    assert np.array_equal(
+        pop_class.get_condition_cells("income", positions), cells[positions]
+    )
+    assert pop_class._mask_cache == {}
+
+    before = {prop: values.copy() for prop, values
+              in pop_class.columns.items()}
+    pop_class.update("age", people_id)
+    assert pop_class._draw_counts == {"sex": 1, "age": 2, "income": 2}
+    others = np.setdiff1d(np.arange(popsize), positions)
+    assert np.array_equal(pop_class.columns["sex"], before["sex"])
+    for prop in ["age", "income"]:
+        assert np.array_equal(pop_class.columns[prop][others],
+                              before[prop][others], equal_nan=True)
+    assert not np.array_equal(pop_class.columns["income"][positions],
+                              before["income"][positions], equal_nan=True)
+    assert np.array_equal(
+        pop_class.get_condition_cells("income", positions),
+        pop_class.get_condition_cells("income")[positions],
+    )
+
+    # A boolean mask gives the same update.
+    mask = np.zeros(popsize, dtype=bool)
+    mask[positions] = True
+    pop_classes[1].update("age", mask)
+    assert_frame_equal(pop_classes[0].population, pop_classes[1].population)
+
+    # An empty selection changes nobody, including the dependents.
+    population = pop_classes[0].population.copy()
+    pop_classes[0].update("sex", [])
+    pop_classes[0].update("sex", np.zeros(popsize, dtype=bool))
+    assert_frame_equal(pop_classes[0].population, population)
+
+    # A property that was not drawn yet gets no data for the others.
+    pop_class = PopulationClass(popsize, random_seed)
+    pop_class.add_property(pop_classes[0].prob_objects["sex"])
+    pop_class.update("sex", np.array([5.0]))
+    sex = pop_class.columns["sex"]
+    assert sex[5] in [0, 1]
+    assert (np.delete(sex, 5) == pop_class.prob_objects["sex"].nodata).all()
+
+    with pytest.raises(AssertionError):
+        pop_class.update("sex", [5.7])
+    with pytest.raises(AssertionError):
+        pop_class.update("sex", [popsize])
+    with pytest.raises(AssertionError):
+        pop_class.update("sex", np.ones(popsize - 1, dtype=bool))
+    with pytest.raises(AssertionError):
+        pop_class.update("sex", "some")
+
+
+def test_PopClass_quota():
+    """
+    With quota sampling every condition cell gets the exact number of people
+    per option, also when a subset of the people is redrawn.
+    """
+    yaml_folder = "./tests/testdata/ProbabilityClass/"
+    yaml_objects = load_yamls([yaml_folder + "sex_quota.yml",
+                               yaml_folder + "age_quota.yml"])
+    pop_class = PopulationClass(1001, 100, block_size=64)
+    for y_obj in yaml_objects:
+        pop_class.add_property(DiscreteProbabilityClass(y_obj))
+    pop_class.update()
+
+    sex = pop_class.columns["sex"]
+    # 1001 * 0.504 = 504.5 males, which is rounded up.
+    assert np.sum(sex == 0) == 505
+    # The ages are rounded per sex, in the order of the data file.
+    cdf_table = pop_class.prob_objects["age"].cdf_table
+    counts = allocate_quota(cdf_table, np.bincount(sex))
+    for option in [0, 1]:
+        offsets = cdf_table.offsets[option:option + 2]
+        ages = pop_class.columns["age"][sex == option]
+        assert np.array_equal(
+            np.bincount(ages, minlength=offsets[1] - offsets[0]),
+            counts[offsets[0]:offsets[1]],
+        )
+
+    people_id = np.arange(0, 1001, 3)
+    pop_class.update("sex", people_id=people_id)
+    assert np.sum(pop_class.columns["sex"][people_id] == 0) == 168
+
+    # Quotas depend on everyone in a cell, so they can not be counter-based.
+    pop_class = PopulationClass(10, 100, counter_based=True)
+    pop_class.add_property(DiscreteProbabilityClass(yaml_objects[0]))
+    with pytest.raises(AssertionError):
+        pop_class.update()
+
+    # Quotas taken per chunk would depend on the chunks and workers.
+    pop_class = PopulationClass(1001, 100, block_size=64, workers=2)
+    pop_class.add_property(DiscreteProbabilityClass(yaml_objects[0]))
+    with pytest.raises(AssertionError):
+        pop_class.update()
+    pop_class.workers = 1
+    with pytest.raises(AssertionError):
+        pop_class.stream("quota.csv", 128, nowrite=True)
+
+
+def test_PopClass_get_person(tmp_path):
+    """
+    With counter-based random numbers, the attributes of single people match
+    those drawn for the whole population, also when it is streamed or drawn
+    again.
+    """
+    popsize = 100
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_objects = load_yamls(find_yamls(yaml_folder))
+    pop_class = PopulationClass(popsize, 100, block_size=16,
+                                counter_based=True)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+
+    # Before drawing, people are computed as the first draw will be.
+    people_id = [97, 3, 15, 16, 17, 60]
+    people = pop_class.get_person(people_id)
+    pop_class.update()
+    population = pop_class.get_labelled_population()
+    expected = population.iloc[sorted(people_id)].reset_index(drop=True)
+    assert_frame_equal(people, expected, check_exact=True)
+    assert_frame_equal(pop_class.get_person(people_id), expected,
+                       check_exact=True)
+
+    # Drawing in chunks gives the same people.
+    fresh = PopulationClass(popsize, 100, block_size=16, counter_based=True)
+    for prob_obj in pop_class.prob_objects.values():
+        fresh.add_property(prob_obj)
+    chunks = pd.concat([chunk.get_labelled_population()
+                        for chunk in fresh.iter_chunks(32)])
+    assert_frame_equal(
+        chunks.iloc[sorted(people_id)].reset_index(drop=True),
+        fresh.get_person(people_id),
+        check_exact=True,
+    )
+
+    # After a redraw of the sex and the dependent properties, people match
+    # the new values.
+    pop_class.update("sex")
+    population = pop_class.get_labelled_population()
+    assert_frame_equal(
+        pop_class.get_person(people_id),
+        population.iloc[sorted(people_id)].reset_index(drop=True),
+        check_exact=True,
+    )
+    # People beyond the population can be computed as well.
+    assert pop_class.get_person([10 ** 9])["person_id"].tolist() == [10 ** 9]
+
+    # After a redraw of some people, the values come from different draws.
+    pop_class.update("sex", [5])
+    with pytest.raises(AssertionError):
+        pop_class.get_person([7])
+    pop_class.export(str(tmp_path / "partial"), file_format="npy")
+    with pytest.raises(AssertionError):
+        load_population(str(tmp_path / "partial")).get_person([7])
+    # Drawing the properties for everyone again resolves this.
+    pop_class.update("sex")
+    population = pop_class.get_labelled_population()
+    assert_frame_equal(
+        pop_class.get_person([5, 7]),
+        population.iloc[[5, 7]].reset_index(drop=True),
+        check_exact=True,
+    )
+
+    with pytest.raises(AssertionError):
+        PopulationClass(popsize, 100).get_person(people_id)
+
 
 def test_PopClass_export():
     """
@@ -285,12 +718,259 @@ def test_PopClass_export():
         if prob_obj.data_type in ["categorical", "ordinal"]:
             prop = prob_obj.property_name
             population_w_labels[prop] = population_w_labels[prop]\
-                .apply(lambda idx: 'nodata' if np.isnan(idx)
-                       else prob_obj.labels[int(idx)])
+                .apply(lambda idx: 'nodata' if idx == prob_obj.nodata
+                       else prob_obj.labels[idx])
     assert_frame_equal(pop_class_from_export, population_w_labels), \
         "Population written to file is different than calculated"
 
 
+def test_PopClass_export_in_parts(tmp_path, monkeypatch, capsys):
+    """
+    Writing the population a range of people at a time gives the same file
+    as writing it at once. The population is only printed when asked.
+    """
+    popsize = 100
+    random_seed = 100
+    pop_class = PopulationClass(popsize, random_seed)
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+    pop_class.update(property_name="all")
+
+    pop_class.export(str(tmp_path / "at_once.csv"))
+    assert "Generated population" not in capsys.readouterr().out
+    monkeypatch.setattr("simago.writers.WRITE_ROWS", 7)
+    pop_class.export(str(tmp_path / "in_parts.csv"), print_population=True)
+    assert "Generated population" in capsys.readouterr().out
+    assert (tmp_path / "at_once.csv").read_text() == \
+        (tmp_path / "in_parts.csv").read_text()
+
+    # Labels are looked up per range of the population, with 'nodata' for
+    # the code for missing data.
+    pop_class.columns["sex"][3] = pop_class.prob_objects["sex"].nodata
+    population_w_labels = pop_class.get_labelled_population(2, 5)
+    assert population_w_labels["person_id"].tolist() == [2, 3, 4]
+    assert population_w_labels["sex"][1] == "nodata"
+
+
+def test_PopClass_stream(tmp_path):
+    """
+    Generating and writing the population in chunks gives the same file as
+    updating and exporting the full population, for any chunk size.
+    """
+    popsize = 100
+    random_seed = 100
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    pop_class = PopulationClass(popsize, random_seed, block_size=8)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+
+    # Chunks cover the population in order and are rounded up to a
+    # multiple of the block size.
+    chunks = list(pop_class.iter_chunks(20))
+    assert [chunk.first_person_id for chunk in chunks] == [0, 24, 48, 72, 96]
+    assert [chunk.popsize for chunk in chunks] == [24, 24, 24, 24, 4]
+    assert np.array_equal(chunks[1].population["person_id"],
+                          np.arange(24, 48))
+
+    for chunk_size in [8, 20, 100]:
+        pop_class.stream(str(tmp_path / ("stream_%d.csv" % chunk_size)),
+                         chunk_size)
+    pop_class.stream(str(tmp_path / "nowrite.csv"), 8, nowrite=True)
+    assert not (tmp_path / "nowrite.csv").exists()
+
+    # Streaming does not draw the population itself.
+    assert pop_class.columns == {}
+    pop_class.update()
+    pop_class.export(str(tmp_path / "export.csv"))
+    exported = (tmp_path / "export.csv").read_text()
+    for chunk_size in [8, 20, 100]:
+        assert (tmp_path / ("stream_%d.csv" % chunk_size)).read_text() == \
+            exported
+
+
+def test_PopClass_workers(tmp_path):
+    """
+    Drawing the population with worker processes gives the same population
+    as drawing it in the current process.
+    """
+    popsize = 100
+    random_seed = 100
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    probab_objects = []
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            probab_objects.append(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            probab_objects.append(ContinuousProbabilityClass(y_obj))
+
+    pop_classes = [PopulationClass(popsize, random_seed, block_size=8,
+                                   workers=workers) for workers in [1, 2]]
+    for pop_class in pop_classes:
+        for probab_object in probab_objects:
+            pop_class.add_property(probab_object)
+        pop_class.update()
+    assert_frame_equal(pop_classes[0].population, pop_classes[1].population)
+    assert pop_classes[1]._draw_counts == {"sex": 1, "age": 1, "income": 1}
+    assert pop_classes[1].prob_objects.keys() == {"sex", "age", "income"}
+
+    for workers, pop_class in zip([1, 2], pop_classes):
+        pop_class.stream(str(tmp_path / ("stream_%d.csv" % workers)), 16)
+    assert (tmp_path / "stream_1.csv").read_text() == \
+        (tmp_path / "stream_2.csv").read_text()
+
+    # The functions of the worker processes, run in this process.
+    chunk = pop_classes[0].get_chunk(16, 48)
+    chunk.update()
+    _init_worker(pop_classes[0].prob_objects)
+    try:
+        worker_chunk = pop_classes[0].get_chunk(16, 48)
+        worker_chunk.prob_objects = {}
+        worker_chunk = _draw_chunk(worker_chunk)
+    finally:
+        _init_worker({})
+    assert worker_chunk.prob_objects == {}
+    assert chunk.columns.keys() == worker_chunk.columns.keys()
+    for prop, values in chunk.columns.items():
+        assert np.array_equal(values, worker_chunk.columns[prop],
+                              equal_nan=True)
+
+    with pytest.raises(AssertionError):
+        PopulationClass(popsize, random_seed, workers=0)
+
+
+def test_PopClass_scipy_sampling():
+    """
+    Continuous properties of a family that NumPy can not draw are drawn per
+    condition cell with scipy.stats, also by worker processes.
+    """
+    yaml_folder = "./tests/testdata/ProbabilityClass/"
+    yaml_objects = load_yamls([yaml_folder + "sex.yml",
+                               yaml_folder + "age.yml",
+                               yaml_folder + "income_t.yml"])
+    probab_objects = [DiscreteProbabilityClass(yaml_objects[0]),
+                      DiscreteProbabilityClass(yaml_objects[1]),
+                      ContinuousProbabilityClass(yaml_objects[2])]
+    assert probab_objects[2].family_table is None
+
+    pop_classes = [PopulationClass(2000, 100, block_size=256,
+                                   workers=workers) for workers in [1, 2]]
+    for pop_class in pop_classes:
+        for probab_object in probab_objects:
+            pop_class.add_property(probab_object)
+        pop_class.update()
+    assert_frame_equal(pop_classes[0].population, pop_classes[1].population)
+
+    pop_class = pop_classes[0]
+    cells = pop_class.get_condition_cells("income")
+    income = pop_class.columns["income"]
+    assert np.isnan(income[cells == -1]).all()
+    for cond_index, median in [(0, 1000), (1, 2000)]:
+        assert abs(np.median(income[cells == cond_index]) - median) < 0.5
+
+
+def test_PopClass_store_property():
+    """
+    Stored values replace the column of a property without redrawing the
+    properties that depend on it.
+    """
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    pop_class = PopulationClass(100, 100)
+    for y_obj in load_yamls(find_yamls(yaml_folder)):
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+    pop_class.update()
+    age = pop_class.columns["age"].copy()
+
+    pop_class.store_property("sex", np.zeros(100))
+    assert pop_class.columns["sex"].dtype == \
+        pop_class.prob_objects["sex"].dtype
+    assert (pop_class.columns["sex"] == 0).all()
+    assert np.array_equal(pop_class.columns["age"], age)
+    assert (pop_class.get_condition_cells("age") == 0).all()
+    with pytest.raises(AssertionError):
+        pop_class.store_property("sex", np.zeros(99))
+    with pytest.raises(AssertionError):
+        pop_class.store_property("height", np.zeros(100))
+
+
+def test_PopClass_quantile_table():
+    """
+    Continuous properties with a quantile table are drawn within the
+    tabulated quantiles of their condition cell.
+    """
+    yaml_folder = "./tests/testdata/ProbabilityClass/"
+    yaml_objects = load_yamls([yaml_folder + "sex.yml",
+                               yaml_folder + "age.yml",
+                               yaml_folder + "income_quantile_table.yml"])
+    pop_class = PopulationClass(2000, 100, block_size=256)
+    for y_obj in yaml_objects[:2]:
+        pop_class.add_property(DiscreteProbabilityClass(y_obj))
+    pop_class.add_property(ContinuousProbabilityClass(yaml_objects[2]))
+    pop_class.update()
+
+    quantile_table = pop_class.prob_objects["income"].quantile_table
+    cells = pop_class.get_condition_cells("income")
+    income = pop_class.columns["income"]
+    assert np.isnan(income[cells == -1]).all()
+    for cond_index, median in [(0, 1000), (1, 2000)]:
+        cell_income = income[cells == cond_index]
+        assert cell_income.min() >= quantile_table[cond_index, 0]
+        assert cell_income.max() <= quantile_table[cond_index, -1]
+        assert abs(np.median(cell_income) / median - 1) < 0.2
+
+
+def test_PopClass_threads():
+    """
+    Properties are drawn after the properties they depend on, also when
+    they are added in a different order. Drawing the properties of a level
+    with multiple threads gives the same population.
+    """
+    popsize = 100
+    random_seed = 100
+    yaml_filenames = ["./tests/testdata/PopulationClass/3_income.yml",
+                      "./tests/testdata/PopulationClass/2_age.yml",
+                      "./tests/testdata/PopulationClass/1_sex.yml",
+                      "./tests/testdata/ProbabilityClass/many_options.yml"]
+    yaml_objects = load_yamls(yaml_filenames)
+    probab_objects = [ContinuousProbabilityClass(yaml_objects[0])] + [
+        DiscreteProbabilityClass(y_obj) for y_obj in yaml_objects[1:]
+    ]
+
+    pop_classes = [PopulationClass(popsize, random_seed, block_size=8,
+                                   threads=threads) for threads in [1, 2]]
+    for pop_class in pop_classes:
+        for probab_object in probab_objects:
+            pop_class.add_property(probab_object)
+        pop_class.update()
+        assert list(pop_class.columns) == ["sex", "many_options", "age",
+                                           "income"]
+    assert_frame_equal(pop_classes[0].population, pop_classes[1].population)
+
+    # Updates without properties to draw do nothing.
+    population = pop_classes[1].population.copy()
+    pop_classes[1].update("nonexistent")
+    assert_frame_equal(pop_classes[1].population, population)
+    pop_class = PopulationClass(popsize, random_seed, threads=2)
+    pop_class.update()
+    assert pop_class.columns == {}
+
+    with pytest.raises(AssertionError):
+        PopulationClass(popsize, random_seed, threads=0)
+
+
 def test_generate_population():
     """
     Test the function generate_population()
@@ -339,10 +1019,15 @@ def test_construct_query_string():
         "sex >= 0",
         "sex < 0",
         "sex > 0",
-        "sex ~= 0",
+        "sex != 0",
     ]
     query_list = [None] * len(relation_list)
     for k, rel in enumerate(relation_list):
         query_list[k] = construct_query_string(property_name, option, rel)
 
     assert query_list == test_list
+
+    # Every query string should be accepted by Pandas.
+    population = pd.DataFrame({"sex": [0, 1]})
+    for query_string in query_list:
+        population.query(query_string)
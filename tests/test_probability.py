@@ -1,11 +1,29 @@
 """Tests corresponding to the simago/probability.py file."""
+import numpy as np
 import pandas as pd
 import pytest
 
+from scipy import stats
+
 from simago.probability import (
     ContinuousProbabilityClass,
     DiscreteProbabilityClass,
+    allocate_quota,
+    build_alias_table,
+    build_cdf_table,
+    build_family_table,
+    build_quantile_table,
     check_comb_conditions,
+    draw_from_alias_table,
+    draw_from_cdf_table,
+    draw_from_disc_distribution,
+    draw_from_family_table,
+    draw_from_quantile_table,
+    draw_from_quota,
+    find_cycle,
+    get_dependency_levels,
+    order_probab_objects,
+    split_condition_cells,
 )
 from simago.yamlutils import load_yamls
 
@@ -42,6 +60,42 @@ def test_ProbClass_read_data():
     assert prob_object.labels == test_labels
 
 
+def test_ProbClass_dtype():
+    """
+    Without a declared dtype, discrete properties are stored in the smallest
+    unsigned integer type that fits the options and the code for missing
+    data. A declared dtype must fit these codes.
+    """
+    test_yaml = "./tests/testdata/ProbabilityClass/sex.yml"
+    prob_object = DiscreteProbabilityClass(load_yamls([test_yaml])[0])
+    assert prob_object.dtype == np.uint8
+    assert prob_object.nodata == 2
+    assert prob_object.cdf_table.options.dtype == np.uint8
+    assert prob_object.alias_table.options.dtype == np.uint8
+
+    # Signed types fit the codes if their maximum is large enough.
+    yaml_object = load_yamls([test_yaml])[0]
+    yaml_object["dtype"] = "int8"
+    prob_object = DiscreteProbabilityClass(yaml_object)
+    assert prob_object.dtype == np.int8
+    assert prob_object.cdf_table.options.dtype == np.int8
+
+    test_yaml = "./tests/testdata/ProbabilityClass/many_options.yml"
+    prob_object = DiscreteProbabilityClass(load_yamls([test_yaml])[0])
+    assert prob_object.dtype == np.uint16
+    assert prob_object.nodata == 300
+
+    test_yaml = "./tests/testdata/ProbabilityClass/dtype_too_small.yml"
+    yaml_object = load_yamls([test_yaml])
+    with pytest.raises(AssertionError):
+        prob_object = DiscreteProbabilityClass(yaml_object[0])
+
+    test_yaml = "./tests/testdata/ProbabilityClass/income.yml"
+    prob_object = ContinuousProbabilityClass(load_yamls([test_yaml])[0])
+    assert prob_object.dtype == np.float64
+    assert np.isnan(prob_object.nodata)
+
+
 def test_ContProbClass_import_pdf():
     """
     If a ContinuousProbabilityClass object is intialized, it must be
@@ -86,6 +140,215 @@ def test_ProbClass_gen_probabs():
     assert prob_object.probabs.equals(test_probabs)
 
 
+def test_build_alias_table():
+    """
+    The alias table built by build_alias_table() must represent the
+    original discrete probability distribution exactly.
+    """
+    test_probabs = [
+        [1.0],
+        [0.5, 0.5],
+        [0.1, 0.0, 0.6, 0.3],
+        np.random.default_rng(0).random(1000),
+    ]
+    for probabs in test_probabs:
+        probabs = np.asarray(probabs) / np.sum(probabs)
+        num_options = probabs.shape[0]
+        alias_table = build_alias_table(np.arange(num_options), probabs)
+        # Every slot contributes its probability to the option in the slot
+        # and the remainder to its alias.
+        implied = alias_table.prob.copy()
+        np.add.at(implied, alias_table.alias, 1.0 - alias_table.prob)
+        assert np.allclose(implied / num_options, probabs)
+
+
+def test_draw_from_alias_table():
+    """
+    Values drawn from an alias table are options of the distribution and
+    follow its probabilities; draw_from_disc_distribution() draws the
+    options and not their positions.
+    """
+    probabs = pd.DataFrame(
+        {
+            "option": [3, 5, 9],
+            "probab": [0.2, 0.0, 0.8],
+            "condition_index": [0, 0, 0],
+        }
+    )
+    alias_table = build_alias_table(probabs.option, probabs.probab)
+    drawn_values = draw_from_alias_table(alias_table, 100000, 100)
+    assert set(np.unique(drawn_values)) == {3, 9}
+    assert abs(np.mean(drawn_values == 3) - 0.2) < 0.01
+
+    drawn_values = draw_from_disc_distribution(probabs, 1000, 100)
+    assert drawn_values.shape == (1000, )
+    assert set(np.unique(drawn_values)) == {3, 9}
+
+
+def test_build_cdf_table():
+    """
+    The stacked CDF table contains the cumulative probabilities per
+    condition index, with offsets for every condition index up to the
+    largest one.
+    """
+    probabs = pd.DataFrame(
+        {
+            "option": [0, 1, 2, 5, 7],
+            "probab": [0.3, 0.7, 0.1, 0.0, 0.9],
+            "condition_index": [2, 2, 0, 0, 0],
+        }
+    )
+    cdf_table = build_cdf_table(probabs)
+    assert cdf_table.options.tolist() == [2, 5, 7, 0, 1]
+    assert np.allclose(cdf_table.cumprobs, [0.1, 0.1, 1.0, 0.3, 1.0])
+    assert cdf_table.offsets.tolist() == [0, 3, 3, 5]
+
+    # Every person gets an option from the distribution of their cell.
+    cells = np.repeat([0, 2], 50000)
+    drawn_values = draw_from_cdf_table(cdf_table, cells, 100)
+    assert set(np.unique(drawn_values[cells == 0])) == {2, 7}
+    assert set(np.unique(drawn_values[cells == 2])) == {0, 1}
+    assert abs(np.mean(drawn_values[cells == 0] == 2) - 0.1) < 0.01
+    assert abs(np.mean(drawn_values[cells == 2] == 0) - 0.3) < 0.01
+    assert np.allclose(cdf_table.keys, [0.1, 0.1, 1.0, 2.3, 3.0])
+
+    # A random number just below one can round the target up to the next
+    # condition index; the last option of the cell is drawn.
+    class LargestGenerator(np.random.Generator):
+        """Generator that draws the largest float below one."""
+        def random(self, size=None):
+            """Largest float below one for every draw."""
+            return np.full(size, 1 - 2 ** -53)
+
+    probabs = pd.DataFrame({
+        "option": np.tile([0, 1], 1001),
+        "probab": 0.5,
+        "condition_index": np.repeat(np.arange(1001), 2),
+    })
+    cdf_table = build_cdf_table(probabs)
+    cells = np.array([999, 1000])
+    drawn_values = draw_from_cdf_table(
+        cdf_table, cells, LargestGenerator(np.random.PCG64())
+    )
+    assert drawn_values.tolist() == [1, 1]
+
+
+def test_allocate_quota():
+    """
+    The people of every condition cell are divided over the options with
+    the largest remainder method, and assigned exactly these counts.
+    """
+    probabs = pd.DataFrame(
+        {
+            "option": [0, 1, 2, 5, 7],
+            "probab": [0.3, 0.7, 0.1, 0.0, 0.9],
+            "condition_index": [2, 2, 0, 0, 0],
+        }
+    )
+    cdf_table = build_cdf_table(probabs)
+    # Cell 0: 0.5 and 4.5 people round to 1 and 4; ties go to the first
+    # option. Cell 2: 0.9 and 2.1 people round to 1 and 2.
+    counts = allocate_quota(cdf_table, np.array([5, 0, 3]))
+    assert counts.tolist() == [1, 0, 4, 1, 2]
+    counts = allocate_quota(cdf_table, np.array([12, 0, 1]))
+    assert counts.tolist() == [1, 0, 11, 0, 1]
+
+    cells = np.random.default_rng(0).choice([0, 2], 1001)
+    drawn_values = draw_from_quota(cdf_table, cells, 100)
+    cell_counts = np.bincount(cells, minlength=3)
+    expected = allocate_quota(cdf_table, cell_counts)
+    for cond_index, option, count in zip(
+        [0, 0, 0, 2, 2], cdf_table.options, expected
+    ):
+        assert np.sum(drawn_values[cells == cond_index] == option) == count
+    # The options are assigned in a random order.
+    assert not np.array_equal(drawn_values,
+                              draw_from_quota(cdf_table, cells, 101))
+
+
+def test_build_family_table():
+    """
+    Distributions of the families that NumPy can draw from give the same
+    values as scipy.stats for the same generator. Unknown or mixed
+    families are left to scipy.stats.
+    """
+    frozen_rvs = [
+        stats.norm(loc=3, scale=2),
+        stats.lognorm(0.5, scale=1000),
+        stats.gamma(2.5, loc=1),
+        stats.expon(scale=4),
+        stats.uniform(loc=-1, scale=3),
+        stats.beta(2, 5),
+    ]
+    cells = np.zeros(1000, dtype=np.int64)
+    for rv in frozen_rvs:
+        family_table = build_family_table([rv])
+        assert family_table.name == rv.dist.name
+        drawn = draw_from_family_table(family_table, cells, 100)
+        assert np.allclose(
+            drawn, rv.rvs(size=1000, random_state=np.random.default_rng(100))
+        )
+
+    assert build_family_table([stats.t(3)]) is None
+    assert build_family_table([stats.norm(), stats.expon()]) is None
+
+    # Parameters are broadcast per person.
+    family_table = build_family_table(
+        [stats.gamma(a, loc=loc, scale=0.001)
+         for a, loc in [(1, 0), (5, 100), (2, 200)]]
+    )
+    assert family_table.shapes.tolist() == [[1, 5, 2]]
+    cells = np.array([2, 0, 1, 1, 2])
+    drawn = draw_from_family_table(family_table, cells, 100)
+    assert np.allclose(drawn, family_table.loc[cells], atol=0.1)
+
+
+def test_build_quantile_table():
+    """
+    The quantile table interpolates the quantile function of any
+    continuous distribution, including ones defined by their pdf only.
+    """
+    class Triangular(stats.rv_continuous):
+        """Distribution given only by its pdf, 2x on [0, 1]."""
+        def _pdf(self, x):
+            """Probability density function."""
+            return 2 * x
+
+    probs = (np.arange(64) + 0.5) / 64
+    quantile_table = build_quantile_table(
+        [Triangular(a=0, b=1)(), stats.norm(loc=3, scale=2)], 64
+    )
+    assert quantile_table.shape == (2, 64)
+    assert np.allclose(quantile_table[0], np.sqrt(probs))
+    assert np.allclose(quantile_table[1], stats.norm.ppf(probs, 3, 2))
+
+    cells = np.repeat([1, 0], 100000)
+    drawn = draw_from_quantile_table(quantile_table, cells, 100)
+    assert np.isclose(drawn[:100000].mean(), 3, atol=0.05)
+    assert np.isclose(drawn[:100000].std(), 2, atol=0.05)
+    assert np.isclose(drawn[100000:].mean(), 2 / 3, atol=0.01)
+    assert drawn[100000:].min() >= quantile_table[0, 0]
+    assert drawn[100000:].max() <= quantile_table[0, -1]
+
+    test_yaml = "./tests/testdata/ProbabilityClass/income_quantile_table.yml"
+    prob_object = ContinuousProbabilityClass(load_yamls([test_yaml])[0])
+    assert prob_object.sampling == "quantile_table"
+    assert prob_object.quantile_table.shape == (2, 256)
+    assert prob_object.family_table is None
+
+
+def test_ProbClass_missing_condition_data():
+    """
+    Every condition index in the conditions file of a discrete property
+    must have data.
+    """
+    test_yaml = "./tests/testdata/ProbabilityClass/missing_condition.yml"
+    yaml_object = load_yamls([test_yaml])
+    with pytest.raises(AssertionError):
+        prob_object = DiscreteProbabilityClass(yaml_object[0])
+        del prob_object
+
+
 def test_ProbClass_read_conditions():
     """
     Check that the conditions files is properly imported.
@@ -113,6 +376,30 @@ def test_ProbClass_read_conditions():
     assert prob_object.conditions.equals(test_conditions)
 
 
+def test_ProbClass_compile_conditions():
+    """
+    The conditions are compiled to predicates per condition index and
+    invalid relations are rejected.
+    """
+    test_yaml = "./tests/testdata/ProbabilityClass/age.yml"
+    yaml_object = load_yamls([test_yaml])
+    prob_object = DiscreteProbabilityClass(yaml_object[0])
+    assert prob_object.predicates == {
+        0: [("sex", "eq", 0)],
+        1: [("sex", "eq", 1)],
+    }
+
+    test_yaml = "./tests/testdata/ProbabilityClass/sex.yml"
+    yaml_object = load_yamls([test_yaml])
+    prob_object = DiscreteProbabilityClass(yaml_object[0])
+    assert prob_object.predicates is None
+
+    test_yaml = "./tests/testdata/ProbabilityClass/invalid_relation.yml"
+    yaml_object = load_yamls([test_yaml])
+    with pytest.raises(AssertionError):
+        prob_object = DiscreteProbabilityClass(yaml_object[0])
+
+
 def test_check_comb_conditions_undefinedprop():
     """
     Function check_comb_conditions() returns an AssertionError when
@@ -126,6 +413,73 @@ def test_check_comb_conditions_undefinedprop():
     with pytest.raises(AssertionError):
         check_comb_conditions(prob_objects)
 
+
+def test_check_comb_conditions_cycle():
+    """
+    Function check_comb_conditions() returns an AssertionError that reports
+    the cycle when properties depend on each other.
+    """
+    test_yamls = ["./tests/testdata/ProbabilityClass/sex.yml",
+                  "./tests/testdata/ProbabilityClass/cycle_a.yml",
+                  "./tests/testdata/ProbabilityClass/cycle_b.yml"]
+    yaml_objects = load_yamls(test_yamls)
+    prob_objects = [DiscreteProbabilityClass(y_obj) for y_obj in yaml_objects]
+    assert prob_objects[1].dependencies == ["cycle_b"]
+    with pytest.raises(AssertionError, match="cycle_a -> cycle_b -> cycle_a"):
+        check_comb_conditions(prob_objects)
+    with pytest.raises(AssertionError, match="Circular dependency"):
+        get_dependency_levels(prob_objects)
+
+
+def test_find_cycle():
+    """
+    Function find_cycle() returns a cycle in the dependency graph, or None.
+    """
+    assert find_cycle({"a": [], "b": ["a"], "c": ["a", "b"]}) is None
+    assert find_cycle({"a": ["x"]}) is None
+    assert find_cycle({"a": ["a"]}) == ["a", "a"]
+    assert find_cycle({"a": [], "b": ["a", "d"], "c": ["b"], "d": ["c"]}) \
+        == ["b", "d", "c", "b"]
+
+
+def test_get_dependency_levels():
+    """
+    The ProbabilityClass objects are sorted topologically into levels,
+    independent of the order in which they are defined.
+    """
+    test_yamls = ["./tests/testdata/PopulationClass/3_income.yml",
+                  "./tests/testdata/PopulationClass/2_age.yml",
+                  "./tests/testdata/ProbabilityClass/many_options.yml",
+                  "./tests/testdata/PopulationClass/1_sex.yml"]
+    yaml_objects = load_yamls(test_yamls)
+    prob_objects = [ContinuousProbabilityClass(yaml_objects[0])] + [
+        DiscreteProbabilityClass(y_obj) for y_obj in yaml_objects[1:]
+    ]
+    levels = get_dependency_levels(prob_objects)
+    assert [[obj.property_name for obj in level] for level in levels] == [
+        ["many_options", "sex"], ["age"], ["income"]
+    ]
+    assert [obj.property_name for obj in
+            order_probab_objects(prob_objects)] == [
+        "many_options", "sex", "age", "income"
+    ]
+    # Dependencies outside of the list are assumed to be drawn already.
+    assert get_dependency_levels(prob_objects[:1]) == [prob_objects[:1]]
+
+
+def test_split_condition_cells():
+    """
+    Function split_condition_cells() groups the positions in the population
+    per condition index and skips the people without a condition cell.
+    """
+    cells = np.array([1, -1, 0, 1, 3, 0, -1])
+    groups = [(cond_index, positions.tolist())
+              for cond_index, positions in split_condition_cells(cells)]
+    assert groups == [(0, [2, 5]), (1, [0, 3]), (3, [4])]
+
+    assert list(split_condition_cells(np.array([], dtype=np.int64))) == []
+    assert list(split_condition_cells(np.array([-1, -1]))) == []
+
 # def test_check_data():
 #    test_yaml = "./tests/testdata/ProbabilityClass/sex.yml"
 #    yaml_object = load_yamls([test_yaml])
@@ -0,0 +1,60 @@
+"""
+Tests for the file simago/synthetic.py.
+"""
+import runpy
+import sys
+
+import simago.synthetic
+
+from simago.population import PopulationClass, load_probab_objects
+from simago.probability import get_dependency_levels
+from simago.synthetic import write_synthetic_settings
+
+
+def test_write_synthetic_settings(tmp_path, monkeypatch):
+    """
+    The synthetic settings can be loaded and drawn, with the requested
+    number of properties, levels and condition cells.
+    """
+    # The pdf file is imported relative to the working directory.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yaml_filenames = write_synthetic_settings(
+        "synthetic_settings/", num_properties=20, num_options=3, fan_out=2,
+        depth=3, continuous_fraction=0.5, random_seed=1,
+    )
+    assert len(yaml_filenames) == 20
+
+    probab_objects = load_probab_objects("./synthetic_settings/")
+    assert len(get_dependency_levels(probab_objects)) == 4
+    data_types = {obj.data_type for obj in probab_objects}
+    assert data_types == {"categorical", "continuous"}
+    for obj in probab_objects:
+        if obj.conditions is None:
+            assert obj.data_type == "categorical"
+        else:
+            assert len(obj.dependencies) == 2
+            assert len(obj.predicates) == 3 ** 2
+
+    pop_class = PopulationClass(100, 100)
+    for obj in probab_objects:
+        pop_class.add_property(obj)
+    pop_class.update()
+    # Every combination of options of the parents has a condition cell.
+    for obj in probab_objects:
+        if obj.data_type == "categorical":
+            assert (pop_class.columns[obj.property_name] < obj.nodata).all()
+
+
+def test_synthetic_command_line(tmp_path, monkeypatch, capsys):
+    """
+    The command line writes the requested number of settings files.
+    """
+    folder = str(tmp_path / "synthetic")
+    monkeypatch.setattr(sys, "argv", [
+        "synthetic.py", folder, "--properties", "6", "--options", "2",
+        "--depth", "1",
+    ])
+    runpy.run_path(simago.synthetic.__file__, run_name="__main__")
+    assert "Written 6 settings files" in capsys.readouterr().out
+    assert len(list((tmp_path / "synthetic").glob("*.yml"))) == 6
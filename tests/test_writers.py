@@ -0,0 +1,148 @@
+"""
+Tests for the file simago/writers.py.
+"""
+import sys
+
+import numpy as np
+import pytest
+
+from simago.population import PopulationClass, load_population
+from simago.probability import (
+    ContinuousProbabilityClass,
+    DiscreteProbabilityClass,
+)
+from simago.writers import MANIFEST, ParquetWriter
+from simago.yamlutils import find_yamls, load_yamls
+
+
+def make_population(popsize=100, random_seed=100):
+    """Population with the properties from the PopulationClass testdata."""
+    pop_class = PopulationClass(popsize, random_seed, block_size=8)
+    yaml_folder = "./tests/testdata/PopulationClass/"
+    yaml_filenames = find_yamls(yaml_folder)
+    yaml_objects = load_yamls(yaml_filenames)
+    for y_obj in yaml_objects:
+        if y_obj["data_type"] in ["categorical", "ordinal"]:
+            pop_class.add_property(DiscreteProbabilityClass(y_obj))
+        elif y_obj["data_type"] in ["continuous"]:
+            pop_class.add_property(ContinuousProbabilityClass(y_obj))
+    return pop_class
+
+
+def test_export_file_format(tmp_path):
+    """
+    Exporting to an unknown file format raises an AssertionError.
+    """
+    pop_class = make_population()
+    pop_class.update()
+    with pytest.raises(AssertionError):
+        pop_class.export(str(tmp_path / "population.xls"),
+                         file_format="xls")
+    with pytest.raises(AssertionError):
+        pop_class.stream(str(tmp_path / "population.xls"), 10,
+                         file_format="xls")
+
+
+def test_ParquetWriter(tmp_path, monkeypatch):
+    """
+    The Parquet file contains the labelled population, with dictionary
+    encoded discrete properties, nulls for missing data and a row group per
+    range of people. Streaming gives the same file contents.
+    """
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr("simago.writers.WRITE_ROWS", 40)
+
+    pop_class = make_population()
+    pop_class.update()
+    output = str(tmp_path / "population.parquet")
+    pop_class.export(output, file_format="parquet")
+
+    table = pq.read_table(output)
+    assert table.column_names == ["person_id", "sex", "age", "income"]
+    assert pa.types.is_dictionary(table.schema.field("sex").type)
+    assert pa.types.is_floating(table.schema.field("income").type)
+    metadata = pq.ParquetFile(output).metadata
+    assert metadata.num_row_groups == 3
+    # The integer labels of age are read back as plain integers, but both
+    # discrete properties are stored with dictionary encoding.
+    for column in [1, 2]:
+        assert "RLE_DICTIONARY" in \
+            metadata.row_group(0).column(column).encodings
+
+    population_w_labels = pop_class.get_labelled_population()
+    from_parquet = table.to_pandas()
+    assert from_parquet["person_id"].tolist() == \
+        population_w_labels["person_id"].tolist()
+    for prop in ["sex", "age"]:
+        assert from_parquet[prop].astype(object).tolist() == \
+            population_w_labels[prop].tolist()
+    income = pop_class.columns["income"]
+    assert np.array_equal(from_parquet["income"].isna(), np.isnan(income))
+    assert np.allclose(from_parquet["income"].dropna(),
+                       income[~np.isnan(income)])
+
+    # Single columns can be read without the others.
+    assert pq.read_table(output, columns=["sex"]).column_names == ["sex"]
+
+    # Missing data of discrete properties is written as null.
+    pop_class.columns["sex"][0] = pop_class.prob_objects["sex"].nodata
+    pop_class.export(output, file_format="parquet")
+    assert pq.read_table(output, columns=["sex"]).column("sex")[0].as_py() \
+        is None
+
+    streamed = str(tmp_path / "streamed.parquet")
+    pop_class.stream(streamed, 16, file_format="parquet")
+    pop_class.update()
+    pop_class.export(output, file_format="parquet")
+    assert pq.read_table(streamed).equals(pq.read_table(output))
+
+
+def test_ParquetWriter_no_pyarrow(tmp_path, monkeypatch):
+    """
+    Without pyarrow, the ParquetWriter raises an ImportError.
+    """
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    pop_class = make_population()
+    with pytest.raises(ImportError):
+        ParquetWriter(str(tmp_path / "population.parquet"), pop_class)
+
+
+def test_NpyWriter(tmp_path):
+    """
+    The population written as .npy files is loaded as memory-mapped
+    columns with the labels and random streams of the written population.
+    Streaming gives the same files.
+    """
+    pop_class = make_population()
+    pop_class.update()
+    pop_class.columns["sex"][0] = pop_class.prob_objects["sex"].nodata
+    output = str(tmp_path / "population")
+    pop_class.export(output, file_format="npy")
+    assert (tmp_path / "population" / MANIFEST).is_file()
+
+    loaded = load_population(output)
+    assert loaded == pop_class
+    assert loaded.prob_objects == {}
+    for prop, values in pop_class.columns.items():
+        assert isinstance(loaded.columns[prop], np.memmap)
+        assert loaded.columns[prop].dtype == values.dtype
+        assert np.array_equal(loaded.columns[prop], values, equal_nan=True)
+    assert loaded.get_labelled_population().equals(
+        pop_class.get_labelled_population()
+    )
+    assert loaded.get_rng("age", 3).random() == \
+        pop_class.get_rng("age", 3).random()
+    # Masks of the loaded population exclude the people without data.
+    assert np.array_equal(loaded.get_condition_mask("sex", "leq", 1),
+                          pop_class.get_condition_mask("sex", "leq", 1))
+
+    streamed = str(tmp_path / "streamed")
+    pop_class.stream(streamed, 16, file_format="npy")
+    loaded = load_population(streamed)
+    pop_class.update()
+    for prop, values in pop_class.columns.items():
+        assert np.array_equal(loaded.columns[prop], values, equal_nan=True)
+
+    with pytest.raises(AssertionError):
+        load_population(str(tmp_path))
@@ -69,6 +69,13 @@ def test_check_yaml():
         "incorrect_pdf_file.yml",
         "pdf_file_not_exist.yml",
         "pdf_file_not_python.yml",
+        "dtype_not_string.yml",
+        "invalid_dtype.yml",
+        "discrete_float_dtype.yml",
+        "continuous_int_dtype.yml",
+        "invalid_sampling.yml",
+        "invalid_discrete_sampling.yml",
+        "quantile_grid_too_small.yml",
     ]
 
     for testfile in testfiles:
@@ -1,7 +1,7 @@
 """
 Functions for the lognormal distribtution.
 """
-from scipy.stats import lognorm, norm
+from scipy.stats import lognorm, norm, t
 
 
 def pdf_norm(params):
@@ -24,3 +24,13 @@ def pdf_lognorm(params):
     scale = params[0]
     s = params[1]
     return lognorm(s=s, scale=scale)
+
+
+def pdf_t(params):
+    """
+    This function returns an instance of scipy.stats.t, a family that is
+    not drawn with NumPy
+    """
+    df = params[0]
+    loc_param = params[1]
+    return t(df, loc=loc_param)